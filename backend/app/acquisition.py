@@ -0,0 +1,163 @@
+"""
+Acquisition pipeline - fetch tracks missing from Plex via slskd
+Takes the unmatched tracks of a preview or import, searches Soulseek for all
+of them concurrently, scores each candidate file against the wanted artist,
+title and duration, and queues the best sources for download.
+"""
+import os
+import re
+import logging
+from typing import Dict, Iterable, List, Optional, Tuple
+
+from . import jobs
+from .download_tracker import tracker
+from .m3u_parser import Track
+from .plex_service import PlexService, normalize_string
+from .slskd_service import SlskdService, SlskdFile
+
+logger = logging.getLogger(__name__)
+
+# Upper bound for searches in flight at once, whatever the request asks for
+MAX_IN_FLIGHT = 20
+
+DEFAULT_SCORING_CONFIG = {
+    "title_weight": 0.5,
+    "artist_weight": 0.3,
+    "duration_weight": 0.2,
+    "min_title_score": 0.6,     # share of title words that must appear in the file name
+    "max_duration_diff": 10,    # seconds; longer or shorter files are rejected
+    "min_score": 0.6
+}
+
+_SPLIT_PATH = re.compile(r'[\\/]')
+
+
+def search_query(track: Track) -> str:
+    """Soulseek query for a track (same form as /api/slskd/search)"""
+    if track.artist and track.title:
+        return f"{track.artist} {track.title}"
+    return track.title or os.path.splitext(track.filename)[0]
+
+
+def _words(s: Optional[str]) -> set:
+    return set(normalize_string((s or '').replace('_', ' ')).split())
+
+
+def _coverage(wanted: set, found: set) -> float:
+    return len(wanted & found) / len(wanted) if wanted else 1.0
+
+
+def score_candidate(f: SlskdFile, track: Track, config: dict = DEFAULT_SCORING_CONFIG) -> float:
+    """0..1 match score of a search result file for a track, 0 when rejected"""
+    parts = _SPLIT_PATH.split(f.filename)
+    name_words = _words(os.path.splitext(parts[-1])[0])
+    # Artist usually appears in the folder names rather than the file name
+    path_words = name_words.union(*(_words(p) for p in parts[:-1]))
+
+    title_score = _coverage(_words(track.title or search_query(track)), name_words)
+    if title_score < config["min_title_score"]:
+        return 0.0
+    artist_score = _coverage(_words(track.artist), path_words)
+
+    if track.duration and f.length:
+        diff = abs(track.duration - f.length)
+        if diff > config["max_duration_diff"]:
+            return 0.0
+        duration_score = 1 - diff / config["max_duration_diff"]
+    else:
+        duration_score = 0.5
+
+    return (
+        config["title_weight"] * title_score
+        + config["artist_weight"] * artist_score
+        + config["duration_weight"] * duration_score
+    )
+
+
+def rank_candidates(files: List[SlskdFile], track: Track, limit: int) -> List[Tuple[float, SlskdFile]]:
+    """Best candidates first. Files arrive sorted by quality, so near-equal
+    scores keep that order."""
+    scored = []
+    for index, f in enumerate(files):
+        if f.is_locked:
+            continue
+        score = score_candidate(f, track)
+        if score >= DEFAULT_SCORING_CONFIG["min_score"]:
+            scored.append((-round(score, 2), index, score, f))
+    scored.sort(key=lambda s: s[:2])
+    return [(score, f) for _, _, score, f in scored[:limit]]
+
+
+def _file_info(f: SlskdFile) -> dict:
+    return {"username": f.username, "filename": f.filename, "size": f.size}
+
+
+def run_acquisition(
+    job_id: str,
+    tracks: Iterable[Track],
+    service: SlskdService,
+    dry_run: bool = False,
+    max_in_flight: Optional[int] = None,
+    plex: Optional[PlexService] = None,
+    playlist_name: Optional[str] = None
+):
+    """Job body for /api/slskd/acquire.
+    With plex given, tracks are matched first and only unmatched ones are acquired.
+    Queued downloads are handed to the download tracker, which adds them to
+    playlist_name once Plex has them."""
+    try:
+        if plex is not None:
+            jobs.update_job(job_id, status="running", phase="matching")
+            tracks = [m.track for m in plex.iter_matches(tracks) if not m.matched]
+
+        # One search per distinct query, shared by duplicate tracks
+        by_query: Dict[str, List[Track]] = {}
+        for track in tracks:
+            by_query.setdefault(' '.join(search_query(track).lower().split()), []).append(track)
+
+        queries = {search_query(group[0]): group for group in by_query.values()}
+        budget = min(max_in_flight or service.settings.max_concurrent_searches, MAX_IN_FLIGHT)
+        jobs.update_job(job_id, status="running", phase="searching", total=len(queries), done=0)
+
+        # Best sources are queued together at the end: one request per peer
+        to_queue: List[Tuple[dict, List[SlskdFile]]] = []
+
+        for query, outcome in service.search_many(queries, max_in_flight=budget):
+            group = queries[query]
+            track = group[0]
+            result = {
+                "artist": track.artist, "title": track.title, "query": query,
+                "tracks": len(group), "status": "not_found", "file": None, "score": None, "message": None
+            }
+            if isinstance(outcome, Exception):
+                result.update(status="failed", message=str(outcome))
+            else:
+                candidates = rank_candidates(outcome.files, track, service.settings.download_attempts)
+                if candidates:
+                    score, best = candidates[0]
+                    result.update(file=_file_info(best), score=round(score, 3))
+                    if dry_run:
+                        result["status"] = "dry_run"
+                    else:
+                        to_queue.append((result, [f for _, f in candidates]))
+                        continue
+            jobs.advance_job(job_id, result)
+
+        if to_queue:
+            jobs.update_job(job_id, phase="queueing")
+            queued = service.queue_many([result["file"] for result, _ in to_queue])
+            for (result, candidates), outcome in zip(to_queue, queued):
+                if not outcome["success"] and len(candidates) > 1:
+                    # Lower-ranked candidates are fallbacks when the best source refuses
+                    outcome = service.queue_download([_file_info(f) for f in candidates[1:]])
+                result.update(status="queued" if outcome["success"] else "failed",
+                              file=outcome["file"] or result["file"], message=outcome["message"])
+                if outcome["success"]:
+                    tracker.watch(result["file"]["username"], result["file"]["filename"],
+                                  queries[result["query"]][0], playlist_name)
+                jobs.advance_job(job_id, result)
+
+        jobs.update_job(job_id, status="done", phase="")
+    except Exception as e:
+        logger.exception("Acquisition failed")
+        jobs.update_job(job_id, status="failed", error=str(e))
@@ -0,0 +1,191 @@
+"""
+Admission control - concurrency limits per endpoint class
+Sync handlers share Starlette's thread pool (about 40 threads). Heavy
+matching and external fetches are admitted through per-class limits before
+they get a thread: requests over the limit wait in a queue on the event loop
+(holding no thread) and get 429 with Retry-After when no slot frees up in
+time. Light endpoints (settings, status, jobs, static files) are never
+limited, so they stay responsive while heavy work runs.
+Limits apply per worker process.
+"""
+import os
+import time
+import asyncio
+import logging
+from collections import deque
+from typing import Any, Callable, Dict, Iterable, Iterator, Optional
+
+from fastapi import HTTPException
+from starlette.background import BackgroundTask
+from starlette.concurrency import run_in_threadpool
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_ADMISSION_CONFIG = {
+    # Playlist matching and imports: CPU and Plex search bound
+    "heavy": {
+        "limit": int(os.environ.get('ADMISSION_HEAVY_LIMIT', '4')),
+        "max_queue": 32,
+        "queue_timeout": float(os.environ.get('ADMISSION_QUEUE_TIMEOUT', '30')),
+        "retry_after": 10
+    },
+    # Single calls to Plex, plex.tv, Spotify or slskd: mostly waiting on the network
+    "external": {
+        "limit": int(os.environ.get('ADMISSION_EXTERNAL_LIMIT', '12')),
+        "max_queue": 64,
+        "queue_timeout": float(os.environ.get('ADMISSION_QUEUE_TIMEOUT', '30')),
+        "retry_after": 5
+    }
+}
+
+
+class Limiter:
+    """Counting limiter with a bounded FIFO queue; only used on the event loop"""
+
+    def __init__(self, name: str, limit: int, max_queue: int, queue_timeout: float, retry_after: int):
+        self.name = name
+        self.limit = limit
+        self.max_queue = max_queue
+        self.queue_timeout = queue_timeout
+        self.retry_after = retry_after
+        self.active = 0
+        self.rejected = 0
+        self._waiters: deque = deque()
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+
+    async def acquire(self, bounded: bool = True):
+        """Take a slot, waiting in line if all are busy. Bounded waits raise 429
+        when the queue is full or queue_timeout passes; unbounded ones (background
+        jobs) wait as long as it takes."""
+        self._loop = asyncio.get_running_loop()
+        if self.active < self.limit and not self._waiters:
+            self.active += 1
+            return
+        if bounded and len(self._waiters) >= self.max_queue:
+            raise self._reject("queue full")
+
+        waiter = self._loop.create_future()
+        self._waiters.append(waiter)
+        try:
+            await asyncio.wait_for(waiter, self.queue_timeout if bounded else None)
+        except asyncio.TimeoutError:
+            raise self._reject("timed out waiting")
+        except BaseException:
+            # Cancelled (client went away): give back a slot handed over meanwhile
+            if waiter.done() and not waiter.cancelled():
+                self._release()
+            raise
+        finally:
+            if waiter in self._waiters:
+                self._waiters.remove(waiter)
+
+    def release(self):
+        """Free a slot; safe to call from worker threads"""
+        try:
+            on_loop = asyncio.get_running_loop() is self._loop
+        except RuntimeError:
+            on_loop = False
+        if on_loop or self._loop is None:
+            self._release()
+        else:
+            self._loop.call_soon_threadsafe(self._release)
+
+    def _release(self):
+        self.active -= 1
+        # Hand the slot straight to the next waiter so it can't be overtaken
+        while self._waiters:
+            waiter = self._waiters.popleft()
+            if not waiter.done():
+                waiter.set_result(None)
+                self.active += 1
+                break
+
+    def _reject(self, reason: str) -> HTTPException:
+        self.rejected += 1
+        logger.warning(f"Rejected {self.name} request: {reason} ({self.active} running)")
+        return HTTPException(
+            status_code=429,
+            detail=f"Server busy ({self.name} requests {reason}), try again later",
+            headers={"Retry-After": str(self.retry_after)}
+        )
+
+    def stats(self) -> dict:
+        return {"limit": self.limit, "active": self.active, "queued": len(self._waiters),
+                "rejected": self.rejected}
+
+
+limiters: Dict[str, Limiter] = {
+    name: Limiter(name, **config) for name, config in DEFAULT_ADMISSION_CONFIG.items()
+}
+
+
+class Slot:
+    """An admitted request's slot, released when the handler returns.
+    Streaming endpoints pass their body through stream() to keep it until
+    the body is sent, and hold() as the response's background as a backstop."""
+
+    def __init__(self, limiter: Limiter):
+        self._limiter = limiter
+        self._released = False
+        self.held = False
+
+    def hold(self) -> BackgroundTask:
+        """Keep the slot past the handler; pass the result as the response's background"""
+        self.held = True
+        return BackgroundTask(self.release)
+
+    def stream(self, body: Iterable) -> Iterator:
+        """Keep the slot past the handler and release it when body is exhausted,
+        raises or is closed (Starlette skips background tasks when a body fails)"""
+        self.held = True
+        return self._stream(body)
+
+    def _stream(self, body: Iterable) -> Iterator:
+        try:
+            yield from body
+        finally:
+            self.release()
+
+    def release(self):
+        if not self._released:
+            self._released = True
+            self._limiter.release()
+
+
+def admit(kind: str) -> Callable:
+    """FastAPI dependency that admits a request of the given class"""
+    limiter = limiters[kind]
+
+    async def dependency():
+        await limiter.acquire()
+        slot = Slot(limiter)
+        try:
+            yield slot
+        except BaseException:
+            slot.release()
+            raise
+        if not slot.held:
+            slot.release()
+
+    return dependency
+
+
+heavy = admit("heavy")
+external = admit("external")
+
+
+async def run_admitted(kind: str, func: Callable, *args: Any, **kwargs: Any):
+    """Background task body: wait for a slot (no timeout), then run func on the thread pool"""
+    limiter = limiters[kind]
+    started = time.time()
+    await limiter.acquire(bounded=False)
+    if time.time() - started > 1:
+        logger.info(f"{getattr(func, '__name__', func)} waited {time.time() - started:.1f}s for a {kind} slot")
+    try:
+        await run_in_threadpool(func, *args, **kwargs)
+    finally:
+        limiter.release()
+
+
+def stats() -> Dict[str, dict]:
+    return {name: limiter.stats() for name, limiter in limiters.items()}
@@ -0,0 +1,108 @@
+"""
+Bulk Spotify import - many playlists in one job
+Playlists are fetched concurrently, their tracks are deduplicated across all
+of them and resolved against Plex once, then each playlist is created from
+the shared results.
+"""
+import logging
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from typing import Dict, List, Tuple
+
+from . import jobs
+from .m3u_parser import Track
+from .library_index import track_identifiers
+from .plex_service import PlexService, MatchResult, normalize_string
+
+logger = logging.getLogger(__name__)
+
+FETCH_WORKERS = 4
+MATCH_WORKERS = 4
+
+
+def _track_key(track: Track) -> Tuple[str, ...]:
+    """Same recording across playlists: by identifier, else normalized artist + title"""
+    ids = track_identifiers(track)
+    if ids:
+        return (ids[0],)
+    return (normalize_string(track.artist), normalize_string(track.title))
+
+
+def run_spotify_bulk_import(job_id: str, urls: List[str], overwrite: bool, spotify, plex: PlexService):
+    """Job body for /api/spotify/import-bulk"""
+    jobs.update_job(job_id, status="running", phase="fetching", total=len(urls), done=0)
+    try:
+        # 1. Fetch all playlists concurrently
+        playlists = {}
+        with ThreadPoolExecutor(max_workers=FETCH_WORKERS) as pool:
+            futures = {pool.submit(spotify.get_playlist, url): url for url in urls}
+            for future in as_completed(futures):
+                url = futures[future]
+                try:
+                    playlists[url] = future.result()
+                    jobs.advance_job(job_id)
+                except Exception as e:
+                    logger.warning("Bulk import: failed to fetch %s: %s", url, e)
+                    jobs.advance_job(job_id, {
+                        "url": url, "playlist_name": None, "total_tracks": 0,
+                        "matched_tracks": 0, "created": False, "error": str(e)
+                    })
+
+        # Skip playlists that already exist before spending time on matching
+        # (if Plex can't list them now, create_playlist still refuses duplicates)
+        existing = set()
+        if not overwrite:
+            try:
+                existing = set(plex.get_existing_playlists())
+            except Exception as e:
+                logger.warning("Bulk import: could not list existing playlists: %s", e)
+        for url, sp_playlist in list(playlists.items()):
+            if sp_playlist.name in existing:
+                del playlists[url]
+                jobs.advance_job(job_id, {
+                    "url": url, "playlist_name": sp_playlist.name,
+                    "total_tracks": len(sp_playlist.tracks), "matched_tracks": 0,
+                    "created": False, "error": f"Playlist '{sp_playlist.name}' already exists"
+                }, step=0)
+
+        # 2. Deduplicate tracks across playlists and resolve each one once
+        unique: Dict[Tuple[str, ...], Track] = {}
+        for sp_playlist in playlists.values():
+            for sp_track in sp_playlist.tracks:
+                track = sp_track.to_track()
+                unique.setdefault(_track_key(track), track)
+
+        jobs.update_job(job_id, phase="matching", total=len(unique), done=0)
+        resolved: Dict[Tuple[str, ...], MatchResult] = {}
+        with ThreadPoolExecutor(max_workers=MATCH_WORKERS) as pool:
+            futures = {pool.submit(plex.find_track, track): key for key, track in unique.items()}
+            for future in as_completed(futures):
+                key = futures[future]
+                try:
+                    resolved[key] = future.result()
+                except Exception as e:
+                    # One failed lookup leaves that track unmatched, not the whole job failed
+                    logger.warning("Bulk import: failed to match %s: %s", unique[key].filename, e)
+                    resolved[key] = MatchResult(track=unique[key], matched=False)
+                jobs.advance_job(job_id)
+        plex.match_cache.flush()
+
+        # 3. Create playlists from the shared resolution results
+        jobs.update_job(job_id, phase="creating", total=len(playlists), done=0)
+        for url, sp_playlist in playlists.items():
+            plex_tracks = []
+            for sp_track in sp_playlist.tracks:
+                match = resolved[_track_key(sp_track.to_track())]
+                if match.matched and match.plex_track:
+                    plex_tracks.append(match.plex_track)
+
+            error = plex.create_playlist(sp_playlist.name, plex_tracks, overwrite=overwrite)
+            jobs.advance_job(job_id, {
+                "url": url, "playlist_name": sp_playlist.name,
+                "total_tracks": len(sp_playlist.tracks), "matched_tracks": len(plex_tracks),
+                "created": error is None, "error": error
+            })
+
+        jobs.update_job(job_id, status="done", phase="")
+    except Exception as e:
+        logger.exception("Bulk Spotify import failed")
+        jobs.update_job(job_id, status="failed", error=str(e))
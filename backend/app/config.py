@@ -1,20 +1,35 @@
 from pydantic_settings import BaseSettings
 from pydantic import Field
-from typing import Optional
+from contextlib import contextmanager
+from typing import Iterator, Optional, Tuple
 import os
+import copy
 import json
+import fcntl
+import tempfile
+import threading
 
 CONFIG_FILE = "/config/settings.json"
+CONFIG_DIR = os.path.dirname(CONFIG_FILE)
+# Held while settings are changed, so other worker processes wait their turn
+SETTINGS_LOCK_FILE = os.path.join(CONFIG_DIR, ".settings.lock")
 
 
 class Settings(BaseSettings):
     plex_url: str = Field(default="http://localhost:32400")
     plex_token: str = Field(default="")
+    # All URIs of the server plex_url belongs to (from plex.tv), raced on connect
+    plex_connections: list = Field(default=[])
     music_library_name: str = Field(default="Music")
+    # Sections to match against, highest priority first (empty: just music_library_name)
+    music_library_names: list = Field(default=[])
     playlists_path: str = Field(default="/music")
     # Spotify settings
     spotify_client_id: str = Field(default="")
     spotify_client_secret: str = Field(default="")
+    # Read artist/title/album/MusicBrainz IDs from the audio files themselves
+    read_embedded_tags: bool = Field(default=False)
+    tag_read_workers: int = Field(default=8)
     # OAuth
     client_id: str = Field(default="")
     # SLSKD settings
@@ -30,22 +45,85 @@ class Settings(BaseSettings):
         extra = "ignore"  # Ignore unknown fields
 
 
-def load_settings() -> dict:
-    """Load settings from config file"""
-    if os.path.exists(CONFIG_FILE):
+# Parsed settings file, reused until the file changes on disk.
+# Keyed by (mtime, size, inode); None key = no file.
+_cache_lock = threading.Lock()
+_write_lock = threading.Lock()
+_cached_data: Optional[Tuple[tuple, dict]] = None
+_cached_settings: Optional[Tuple[tuple, Settings]] = None
+
+
+def _file_key() -> Optional[tuple]:
+    try:
+        st = os.stat(CONFIG_FILE)
+    except FileNotFoundError:
+        return None
+    return (st.st_mtime_ns, st.st_size, st.st_ino)
+
+
+def _load_cached() -> Tuple[tuple, dict]:
+    global _cached_data
+    key = _file_key()
+    with _cache_lock:
+        if _cached_data and _cached_data[0] == key:
+            return _cached_data
+    data = {}
+    if key is not None:
         with open(CONFIG_FILE, "r") as f:
-            return json.load(f)
-    return {}
+            data = json.load(f)
+    with _cache_lock:
+        _cached_data = (key, data)
+    return key, data
+
+
+def load_settings() -> dict:
+    """Load settings from config file (cached until the file changes; returns a copy)"""
+    return copy.deepcopy(_load_cached()[1])
 
 
 def save_settings(settings: dict):
-    """Save settings to config file"""
-    os.makedirs(os.path.dirname(CONFIG_FILE), exist_ok=True)
-    with open(CONFIG_FILE, "w") as f:
-        json.dump(settings, f, indent=2)
+    """Save settings to config file (atomically: readers never see a partial file)"""
+    global _cached_data, _cached_settings
+    directory = os.path.dirname(CONFIG_FILE)
+    os.makedirs(directory, exist_ok=True)
+    fd, tmp_path = tempfile.mkstemp(dir=directory, prefix=".settings-", suffix=".json")
+    try:
+        with os.fdopen(fd, "w") as f:
+            json.dump(settings, f, indent=2)
+            f.flush()
+            os.fsync(f.fileno())
+        # mkstemp creates 0600 files; keep the permissions the file had before
+        os.chmod(tmp_path, os.stat(CONFIG_FILE).st_mode & 0o777 if os.path.exists(CONFIG_FILE) else 0o644)
+        os.replace(tmp_path, CONFIG_FILE)
+    except BaseException:
+        os.unlink(tmp_path)
+        raise
+    with _cache_lock:
+        _cached_data = (_file_key(), copy.deepcopy(settings))
+        _cached_settings = None
+
+
+@contextmanager
+def edit_settings() -> Iterator[dict]:
+    """Load settings for changing and save them on exit (not if the block raises).
+    Writers take turns, so concurrent changes to different keys aren't lost."""
+    with _write_lock:
+        os.makedirs(CONFIG_DIR, exist_ok=True)
+        with open(SETTINGS_LOCK_FILE, "a") as lock:
+            fcntl.flock(lock, fcntl.LOCK_EX)
+            settings = load_settings()
+            yield settings
+            save_settings(settings)
 
 
 def get_settings() -> Settings:
-    """Get settings with file overrides"""
-    file_settings = load_settings()
-    return Settings(**file_settings)
+    """Get settings with file overrides (validated once per file change; treat as read-only)"""
+    global _cached_settings
+    key, data = _load_cached()
+    with _cache_lock:
+        if _cached_settings and _cached_settings[0] == key:
+            return _cached_settings[1]
+    settings = Settings(**data)
+    with _cache_lock:
+        _cached_settings = (key, settings)
+    return settings
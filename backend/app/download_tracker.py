@@ -0,0 +1,198 @@
+"""
+Download tracker - follow queued slskd downloads into Plex playlists
+Polls slskd for the downloads we queued. When files finish, Plex is asked to
+scan just their folder, the tracks they were meant for are matched again and
+appended to the playlist they were missing from.
+Each worker follows the downloads it queued; their states are published to
+the shared store so every worker lists all of them.
+"""
+import os
+import time
+import logging
+import ntpath
+import posixpath
+import threading
+from dataclasses import dataclass, field, asdict
+from typing import Callable, Dict, List, Optional, Tuple
+
+from .m3u_parser import Track
+from .shared_store import get_store
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_TRACKER_CONFIG = {
+    "poll_interval": 10.0,   # seconds between slskd transfer polls
+    "match_attempts": 6,     # polls to wait for Plex to pick up a downloaded file
+    "retention": 3600.0,     # finished downloads are listed this long (seconds)
+    # Downloads not finished after this long are given up on as stalled (seconds)
+    "max_age": float(os.environ.get('DOWNLOAD_TRACKING_MAX_AGE', '43200'))
+}
+
+_NAMESPACE = "downloads"
+
+
+@dataclass
+class TrackedDownload:
+    username: str
+    filename: str
+    track: Track
+    playlist_name: Optional[str] = None
+    state: str = "queued"  # queued, downloaded, added, matched (no playlist), unmatched, failed, stalled
+    queued_at: float = field(default_factory=time.time)
+    finished_at: Optional[float] = None
+    match_attempts: int = 0
+    error: Optional[str] = None
+
+
+def plex_folder(remote_filename: str, download_root: str) -> str:
+    """Folder Plex sees a finished download in. slskd saves files under
+    <downloads>/<remote parent folder>/<file>; download_root is that
+    downloads folder as mounted on the Plex server."""
+    parent = ntpath.basename(ntpath.dirname(remote_filename.replace('/', '\\')))
+    return posixpath.join(download_root, parent) if parent else download_root
+
+
+class DownloadTracker:
+    """Tracked downloads and the background loop that follows them up"""
+
+    def __init__(self, config: Optional[dict] = None):
+        self.config = {**DEFAULT_TRACKER_CONFIG, **(config or {})}
+        self._downloads: Dict[Tuple[str, str], TrackedDownload] = {}
+        self._lock = threading.Lock()
+        self._thread: Optional[threading.Thread] = None
+        self._get_plex: Optional[Callable] = None
+
+    def configure(self, get_plex: Callable):
+        """get_plex() returns a connected PlexService"""
+        self._get_plex = get_plex
+
+    def watch(self, username: str, filename: str, track: Track, playlist_name: Optional[str] = None):
+        """Follow a queued download; starts the background loop if needed"""
+        download = TrackedDownload(username, filename, track, playlist_name)
+        with self._lock:
+            self._downloads[(username, filename)] = download
+        self._save(download)
+        self._start()
+
+    def status(self) -> List[dict]:
+        """Downloads tracked by all workers"""
+        return sorted(get_store().values(_NAMESPACE), key=lambda d: d["queued_at"])
+
+    def _save(self, download: TrackedDownload):
+        # Unfinished entries outlive max_age, after which they are marked stalled
+        ttl = self.config["retention"] if download.finished_at else self.config["max_age"] + self.config["retention"]
+        get_store().put(_NAMESPACE, f"{download.username}/{download.filename}", asdict(download), ttl=ttl)
+
+    def _start(self):
+        with self._lock:
+            if self._thread is not None:
+                return
+            self._thread = threading.Thread(target=self._loop, name="download-tracker", daemon=True)
+            self._thread.start()
+
+    def _active(self) -> List[TrackedDownload]:
+        with self._lock:
+            return self._active_locked()
+
+    def _active_locked(self) -> List[TrackedDownload]:
+        cutoff = time.time() - self.config["retention"]
+        for key in [k for k, d in self._downloads.items() if d.finished_at and d.finished_at < cutoff]:
+            del self._downloads[key]
+        return [d for d in self._downloads.values() if d.state in ("queued", "downloaded")]
+
+    def _loop(self):
+        # Runs while anything is in flight; watch() starts it again
+        while True:
+            with self._lock:
+                if not self._active_locked():
+                    self._thread = None
+                    return
+            try:
+                self.poll()
+            except Exception:
+                logger.exception("Download tracker poll failed")
+            time.sleep(self.config["poll_interval"])
+
+    def _stall_expired(self):
+        """Give up on downloads that didn't finish within max_age, so the loop can stop"""
+        cutoff = time.time() - self.config["max_age"]
+        with self._lock:
+            stalled = [d for d in self._active_locked() if d.queued_at < cutoff]
+            for d in stalled:
+                d.state, d.finished_at = "stalled", time.time()
+                d.error = f"Not finished after {self.config['max_age'] / 3600:.0f}h"
+        for d in stalled:
+            logger.info(f"Giving up on stalled download: {d.username} - {d.filename}")
+            self._save(d)
+
+    def poll(self):
+        """One round: update transfer states, scan finished folders, re-match"""
+        self._stall_expired()
+        tracked = self._active()
+        before = [(d.state, d.match_attempts) for d in tracked]
+        try:
+            self._poll()
+        finally:
+            for d, previous in zip(tracked, before):
+                if (d.state, d.match_attempts) != previous:
+                    self._save(d)
+
+    def _poll(self):
+        from .config import load_settings
+        from .slskd_service import get_slskd_service
+
+        service = get_slskd_service()
+        if not service or not self._get_plex:
+            return
+        settings = load_settings()
+        download_root = settings.get('slskd_plex_download_path', '')
+
+        # 1. Transfer states for everything we queued, in one request
+        states = service.get_download_states()
+        folders = set()
+        for d in self._active():
+            state = states.get((d.username, d.filename), '')
+            if d.state != "queued" or 'Completed' not in state:
+                continue
+            if 'Succeeded' in state:
+                d.state = "downloaded"
+                if download_root:
+                    folders.add(plex_folder(d.filename, download_root))
+            else:
+                d.state, d.error, d.finished_at = "failed", state, time.time()
+
+        downloaded = [d for d in self._active() if d.state == "downloaded"]
+        if not downloaded:
+            return
+        plex = self._get_plex()
+
+        # 2. Partial scan of just the folders that received files. Without a
+        # path mapping we rely on Plex's own folder watching.
+        for folder in folders:
+            logger.info(f"Scanning Plex folder: {folder}")
+            try:
+                plex.scan_folder(folder)
+            except Exception as e:
+                logger.warning(f"Partial scan of {folder} failed: {e}")
+
+        # 3. Re-match the downloaded tracks (the scan may need a few polls)
+        by_playlist: Dict[Optional[str], List[Tuple[TrackedDownload, object]]] = {}
+        for d in downloaded:
+            match = plex.find_track(d.track)
+            if match.matched:
+                by_playlist.setdefault(d.playlist_name, []).append((d, match.plex_track))
+                continue
+            d.match_attempts += 1
+            if d.match_attempts >= self.config["match_attempts"]:
+                d.state, d.finished_at = "unmatched", time.time()
+        plex.match_cache.flush()
+
+        # 4. Append to the playlists the tracks were missing from
+        for playlist_name, found in by_playlist.items():
+            error = plex.add_to_playlist(playlist_name, [item for _, item in found]) if playlist_name else None
+            for d, _ in found:
+                d.state = "failed" if error else ("added" if playlist_name else "matched")
+                d.error, d.finished_at = error, time.time()
+
+
+tracker = DownloadTracker()
@@ -0,0 +1,178 @@
+"""
+Service health registry
+Probes external dependencies (Spotify scraper, slskd, Plex) in the background
+and serves cached status, so request handlers never wait on a health check.
+Each service also has a circuit breaker: after repeated connection failures
+calls fail fast until a cooldown has passed.
+"""
+import time
+import logging
+import threading
+from contextlib import contextmanager
+from dataclasses import dataclass, asdict
+from typing import Callable, Dict, Optional
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_HEALTH_CONFIG = {
+    "probe_interval": 30.0,    # seconds between background probes
+    "ttl": 60.0,               # cached status is trusted this long without a probe
+    "failure_threshold": 3,    # consecutive failures that open the circuit
+    "cooldown": 30.0           # seconds an open circuit rejects calls
+}
+
+
+class CircuitOpenError(Exception):
+    """Raised instead of calling a service whose circuit is open"""
+
+
+@dataclass
+class ServiceHealth:
+    name: str
+    up: bool = False
+    checked_at: float = 0.0
+    latency_ms: Optional[float] = None
+    error: Optional[str] = None
+    consecutive_failures: int = 0
+    circuit_open_until: float = 0.0
+
+
+class HealthRegistry:
+    """Cached health status and circuit breakers for named services"""
+
+    def __init__(self, config: Optional[dict] = None):
+        self.config = {**DEFAULT_HEALTH_CONFIG, **(config or {})}
+        self._probes: Dict[str, Callable[[], bool]] = {}
+        self._status: Dict[str, ServiceHealth] = {}
+        self._lock = threading.Lock()
+        self._thread: Optional[threading.Thread] = None
+        self._stop = threading.Event()
+
+    def register(self, name: str, probe: Callable[[], Optional[bool]]):
+        """probe() returns True when the service is usable, None when it isn't
+        configured; False and exceptions count as failures"""
+        self._probes[name] = probe
+        with self._lock:
+            self._status.setdefault(name, ServiceHealth(name=name))
+
+    # ---- cached status ----
+
+    def status(self, name: str) -> ServiceHealth:
+        with self._lock:
+            health = self._status.setdefault(name, ServiceHealth(name=name))
+            never_checked = health.checked_at == 0
+            stale = time.time() - health.checked_at > self.config["ttl"]
+        # Probe inline only before the first check or when the background loop isn't running
+        if name in self._probes and (never_checked or (stale and not self._running())):
+            self.probe(name)
+        with self._lock:
+            return ServiceHealth(**asdict(self._status[name]))
+
+    def is_up(self, name: str) -> bool:
+        return self.status(name).up
+
+    def all(self) -> Dict[str, dict]:
+        return {name: asdict(self.status(name)) for name in list(self._probes)}
+
+    # ---- circuit breaker ----
+
+    def allow(self, name: str) -> bool:
+        """False while the circuit is open; after the cooldown one call is let through"""
+        with self._lock:
+            health = self._status.get(name)
+            if not health:
+                return True
+            now = time.time()
+            if now < health.circuit_open_until:
+                return False
+            if health.circuit_open_until:
+                # Half-open: this caller tries the service, the rest keep failing fast
+                # until its outcome is recorded (or another cooldown passes without one)
+                health.circuit_open_until = now + self.config["cooldown"]
+            return True
+
+    def record_success(self, name: str, latency_ms: Optional[float] = None):
+        with self._lock:
+            health = self._status.setdefault(name, ServiceHealth(name=name))
+            health.up = True
+            health.error = None
+            health.consecutive_failures = 0
+            health.circuit_open_until = 0.0
+            health.checked_at = time.time()
+            if latency_ms is not None:
+                health.latency_ms = latency_ms
+
+    def record_failure(self, name: str, error: str):
+        with self._lock:
+            health = self._status.setdefault(name, ServiceHealth(name=name))
+            health.up = False
+            health.error = error
+            health.checked_at = time.time()
+            health.consecutive_failures += 1
+            if health.consecutive_failures >= self.config["failure_threshold"]:
+                if health.circuit_open_until < time.time():
+                    logger.warning(f"Circuit opened for {name}: {error}")
+                health.circuit_open_until = time.time() + self.config["cooldown"]
+
+    @contextmanager
+    def guard(self, name: str, failures: tuple = (Exception,)):
+        """Fail fast when the circuit is open; record the call's outcome otherwise.
+        Only exceptions in `failures` count against the service."""
+        if not self.allow(name):
+            raise CircuitOpenError(f"{name} is unavailable (circuit open)")
+        try:
+            yield
+        except failures as e:
+            self.record_failure(name, str(e))
+            raise
+        else:
+            self.record_success(name)
+
+    # ---- probing ----
+
+    def probe(self, name: str) -> bool:
+        started = time.time()
+        try:
+            result = self._probes[name]()
+            if result is None:
+                with self._lock:
+                    health = self._status.setdefault(name, ServiceHealth(name=name))
+                    health.up = False
+                    health.error = "not configured"
+                    health.checked_at = time.time()
+                return False
+            ok = bool(result)
+            error = None if ok else "probe failed"
+        except Exception as e:
+            ok, error = False, str(e)
+        if ok:
+            self.record_success(name, latency_ms=(time.time() - started) * 1000)
+        else:
+            self.record_failure(name, error)
+        return ok
+
+    def probe_all(self):
+        for name in list(self._probes):
+            self.probe(name)
+
+    def _running(self) -> bool:
+        return self._thread is not None and self._thread.is_alive()
+
+    def start(self):
+        """Start the background probe loop (idempotent)"""
+        if self._running():
+            return
+        self._stop.clear()
+        self._thread = threading.Thread(target=self._loop, name="health-probe", daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+
+    def _loop(self):
+        while not self._stop.is_set():
+            self.probe_all()
+            self._stop.wait(self.config["probe_interval"])
+
+
+registry = HealthRegistry()
@@ -0,0 +1,136 @@
+"""
+Shared HTTP transport - pooled sessions for all outbound clients
+Each named client (plex.tv, Plex server, Spotify, scraper, slskd) gets one
+process-wide requests.Session with a keep-alive connection pool, so calls
+reuse connections instead of opening a new TCP/TLS connection every time.
+Also provides the retry/backoff loop shared by those clients.
+"""
+import os
+import time
+import random
+import logging
+import threading
+from typing import Dict, Optional
+
+import requests
+from requests.adapters import HTTPAdapter
+
+from .health import registry as health_registry, CircuitOpenError
+
+logger = logging.getLogger(__name__)
+
+# Connection pools: one pool per host, pool_maxsize connections kept alive per pool
+DEFAULT_POOL_CONFIG = {
+    "pool_connections": int(os.environ.get('HTTP_POOL_CONNECTIONS', '10')),
+    "pool_maxsize": int(os.environ.get('HTTP_POOL_MAXSIZE', '20'))
+}
+
+# Used when a caller does not pass its own timeout (seconds)
+DEFAULT_TIMEOUT = float(os.environ.get('HTTP_TIMEOUT', '30'))
+
+DEFAULT_RETRY_CONFIG = {
+    "max_retries": 3,
+    "initial_delay": 1.0,
+    "max_delay": 10.0,
+    "backoff_multiplier": 2,
+    "retryable_status_codes": [408, 429, 500, 502, 503, 504]
+}
+
+_CONNECTION_ERRORS = (requests.exceptions.ConnectionError, requests.exceptions.Timeout)
+
+_sessions: Dict[str, requests.Session] = {}
+_lock = threading.Lock()
+
+
+def get_session(name: str, verify: bool = True) -> requests.Session:
+    """Process-wide pooled session for a named client (created on first use)"""
+    with _lock:
+        session = _sessions.get(name)
+        if session is None:
+            session = requests.Session()
+            session.verify = verify
+            adapter = HTTPAdapter(**DEFAULT_POOL_CONFIG)
+            session.mount("https://", adapter)
+            session.mount("http://", adapter)
+            _sessions[name] = session
+        return session
+
+
+def close_sessions():
+    """Close all pooled connections (on shutdown)"""
+    with _lock:
+        for session in _sessions.values():
+            session.close()
+        _sessions.clear()
+
+
+def request_with_retry(
+    session: requests.Session,
+    method: str,
+    url: str,
+    max_retries: Optional[int] = None,
+    health: Optional[str] = None,
+    retry_read_timeouts: bool = True,
+    **kwargs
+) -> requests.Response:
+    """Execute request with retry logic.
+    Retries connection errors, timeouts and retryable status codes with
+    exponential backoff and jitter. With `health` set, the service's circuit
+    breaker is checked first and connection failures are recorded against it.
+    retry_read_timeouts=False gives up after a read timeout (for slow calls
+    that wouldn't finish faster on a second attempt).
+    """
+    config = DEFAULT_RETRY_CONFIG.copy()
+    if max_retries is not None:
+        config['max_retries'] = max_retries
+    kwargs.setdefault('timeout', DEFAULT_TIMEOUT)
+
+    # Fail fast while the service is known to be down instead of retrying into it
+    if health and not health_registry.allow(health):
+        raise CircuitOpenError(f"{health} is unavailable (circuit open)")
+
+    last_error = None
+
+    for attempt in range(config['max_retries'] + 1):
+        try:
+            response = session.request(method, url, **kwargs)
+
+            # Check for retryable status codes
+            if response.status_code in config['retryable_status_codes']:
+                response.close()
+                raise requests.exceptions.HTTPError(f"Status {response.status_code}", response=response)
+
+            response.raise_for_status()
+            if health:
+                health_registry.record_success(health)
+            return response
+
+        except requests.exceptions.RequestException as e:
+            last_error = e
+            if health and isinstance(e, _CONNECTION_ERRORS):
+                health_registry.record_failure(health, str(e))
+                if not health_registry.allow(health):
+                    break
+
+            if not retry_read_timeouts and isinstance(e, requests.exceptions.ReadTimeout):
+                break
+
+            # Client errors other than the retryable ones won't change on retry
+            status = e.response.status_code if e.response is not None else None
+            if status is not None and status not in config['retryable_status_codes']:
+                break
+
+            if attempt < config['max_retries']:
+                delay = min(
+                    config['initial_delay'] * (config['backoff_multiplier'] ** attempt),
+                    config['max_delay']
+                )
+                # Add jitter
+                delay = delay * (0.75 + random.random() * 0.5)
+                logger.warning(f"Request failed, retrying in {delay:.1f}s: {e}")
+                time.sleep(delay)
+                continue
+
+            break
+
+    raise last_error or Exception("Request failed")
@@ -0,0 +1,65 @@
+"""
+Background jobs - registry for long-running operations
+Endpoints start work in the background and return a job ID; the UI polls
+/api/jobs/{id} for progress and per-item results. Jobs are kept in the
+shared store, so any worker process can answer the poll.
+"""
+import time
+import uuid
+from dataclasses import dataclass, field, asdict
+from typing import List, Optional
+
+from .shared_store import get_store
+
+# Finished jobs are forgotten after this long (seconds)
+JOB_RETENTION = 3600
+
+_NAMESPACE = "jobs"
+
+
+@dataclass
+class Job:
+    id: str
+    kind: str
+    status: str = "pending"  # pending, running, done, failed
+    phase: str = ""
+    total: int = 0
+    done: int = 0
+    results: List[dict] = field(default_factory=list)
+    error: Optional[str] = None
+    created_at: float = field(default_factory=time.time)
+    finished_at: Optional[float] = None
+
+
+def create_job(kind: str, total: int = 0) -> Job:
+    job = Job(id=uuid.uuid4().hex, kind=kind, total=total)
+    store = get_store()
+    store.expire()
+    store.put(_NAMESPACE, job.id, asdict(job))
+    return job
+
+
+def get_job(job_id: str) -> Optional[dict]:
+    """Snapshot of a job as a dict (None if unknown or expired)"""
+    return get_store().get(_NAMESPACE, job_id)
+
+
+def update_job(job_id: str, **changes):
+    def change(job: dict) -> Optional[float]:
+        job.update(changes)
+        if changes.get("status") in ("done", "failed"):
+            job["finished_at"] = time.time()
+        return JOB_RETENTION if job["finished_at"] else None
+
+    get_store().update(_NAMESPACE, job_id, change)
+
+
+def advance_job(job_id: str, result: Optional[dict] = None, step: int = 1):
+    """Count finished items and optionally record a per-item result"""
+    def change(job: dict) -> Optional[float]:
+        job["done"] += step
+        if result is not None:
+            job["results"].append(result)
+        return JOB_RETENTION if job["finished_at"] else None
+
+    get_store().update(_NAMESPACE, job_id, change)
@@ -0,0 +1,119 @@
+"""
+Incremental JSON decoding for large HTTP responses
+Decodes a top-level JSON object or array from a stream of byte chunks and
+yields the elements of selected arrays one at a time, so the raw body and
+the full decoded tree never have to be in memory together.
+"""
+import codecs
+import json
+from typing import Any, Collection, Iterable, Iterator, Tuple
+
+_decoder = json.JSONDecoder()
+_WHITESPACE = ' \t\n\r'
+_DELIMITERS = _WHITESPACE + ',]}:'
+
+
+class _Reader:
+    """Text buffer over a byte-chunk stream, trimmed as values are consumed"""
+
+    def __init__(self, chunks: Iterable[bytes]):
+        self._chunks = iter(chunks)
+        self._utf8 = codecs.getincrementaldecoder('utf-8')()
+        self.buf = ''
+        self.pos = 0
+        self.eof = False
+
+    def _fill(self) -> bool:
+        """Append the next chunk to the buffer; False once the stream is exhausted"""
+        if self.eof:
+            return False
+        if self.pos:
+            self.buf = self.buf[self.pos:]
+            self.pos = 0
+        for chunk in self._chunks:
+            text = self._utf8.decode(chunk)
+            if text:
+                self.buf += text
+                return True
+        self.eof = True
+        tail = self._utf8.decode(b'', final=True)
+        self.buf += tail
+        return bool(tail)
+
+    def peek(self) -> str:
+        """Next non-whitespace character, '' at end of stream"""
+        while True:
+            while self.pos < len(self.buf) and self.buf[self.pos] in _WHITESPACE:
+                self.pos += 1
+            if self.pos < len(self.buf):
+                return self.buf[self.pos]
+            if not self._fill():
+                return ''
+
+    def expect(self, char: str):
+        found = self.peek()
+        if found != char:
+            raise ValueError(f"Expected {char!r} in JSON stream, got {found!r}")
+        self.pos += 1
+
+    def value(self) -> Any:
+        """Decode one complete JSON value at the current position"""
+        self.peek()
+        while True:
+            try:
+                value, end = _decoder.raw_decode(self.buf, self.pos)
+                # Only trust a value once a delimiter follows it: a number cut
+                # at a chunk boundary ("12" of "12.5") also decodes
+                if self.eof or (end < len(self.buf) and self.buf[end] in _DELIMITERS):
+                    self.pos = end
+                    return value
+            except json.JSONDecodeError:
+                if self.eof:
+                    raise
+            self._fill()
+
+
+def _array_items(reader: _Reader) -> Iterator[Any]:
+    reader.expect('[')
+    if reader.peek() == ']':
+        reader.pos += 1
+        return
+    while True:
+        yield reader.value()
+        found = reader.peek()
+        reader.pos += 1
+        if found == ']':
+            return
+        if found != ',':
+            raise ValueError(f"Expected ',' or ']' in JSON array, got {found!r}")
+
+
+def iter_array(chunks: Iterable[bytes]) -> Iterator[Any]:
+    """Yield the elements of a top-level JSON array one at a time"""
+    yield from _array_items(_Reader(chunks))
+
+
+def iter_object(chunks: Iterable[bytes], stream_keys: Collection[str] = ()) -> Iterator[Tuple[str, Any]]:
+    """Yield (key, value) pairs of a top-level JSON object.
+    For keys in stream_keys whose value is an array, yields (key, element)
+    once per element instead of the whole array.
+    """
+    reader = _Reader(chunks)
+    reader.expect('{')
+    if reader.peek() == '}':
+        return
+    while True:
+        key = reader.value()
+        reader.expect(':')
+        if key in stream_keys and reader.peek() == '[':
+            for item in _array_items(reader):
+                yield key, item
+        else:
+            yield key, reader.value()
+
+        found = reader.peek()
+        reader.pos += 1
+        if found == '}':
+            return
+        if found != ',':
+            raise ValueError(f"Expected ',' or '}}' in JSON object, got {found!r}")
@@ -0,0 +1,337 @@
+"""
+Library snapshot - lightweight copy of a Plex music section
+Holds one small record per track plus an identifier index
+(MusicBrainz ID / ISRC / Plex GUID -> ratingKey), so tracks that carry an
+identifier match exactly with one indexed lookup, without searching or
+string scoring. Snapshot and match cache live in the shared store, so all
+worker processes use the same copy.
+"""
+import os
+import re
+import time
+import sqlite3
+import logging
+import threading
+from dataclasses import dataclass
+from itertools import chain, islice
+from typing import Dict, Iterable, Iterator, List, Optional, Tuple
+
+from .m3u_parser import Track
+from .shared_store import SharedStore, get_store
+
+logger = logging.getLogger(__name__)
+
+# Tracks fetched per Plex request while building a snapshot
+SNAPSHOT_PAGE_SIZE = 1000
+
+# Rows deleted per write when dropping an old or failed snapshot
+SNAPSHOT_DELETE_BATCH = 5000
+
+# An unreferenced snapshot started this long ago (seconds) belongs to a build
+# that died without cleaning up, not to one still running in another worker
+SNAPSHOT_ORPHAN_AGE = 86400
+
+# Cached search matches are trusted this long (seconds)
+MATCH_CACHE_TTL = float(os.environ.get('MATCH_CACHE_TTL', '86400'))
+
+# New matches are written in one transaction per this many (or per flush
+# interval, in seconds) instead of one per track, so matching threads and
+# workers don't queue on the write lock
+MATCH_CACHE_BATCH = 100
+MATCH_CACHE_FLUSH_INTERVAL = 5.0
+
+_UUID_RE = re.compile(r'[0-9a-f]{8}-[0-9a-f]{4}-[0-9a-f]{4}-[0-9a-f]{4}-[0-9a-f]{12}')
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS library_snapshots (
+    library TEXT PRIMARY KEY, generation TEXT, built_at REAL, tracks INTEGER, identifiers INTEGER
+);
+CREATE TABLE IF NOT EXISTS library_tracks (
+    generation TEXT, rating_key INTEGER, title TEXT, grandparent_title TEXT, parent_title TEXT,
+    duration INTEGER, PRIMARY KEY (generation, rating_key)
+);
+CREATE TABLE IF NOT EXISTS library_ids (
+    generation TEXT, id TEXT, rating_key INTEGER, PRIMARY KEY (generation, id)
+);
+CREATE TABLE IF NOT EXISTS match_cache (
+    library TEXT, key TEXT, rating_key INTEGER, title TEXT, grandparent_title TEXT,
+    parent_title TEXT, duration INTEGER, match_type TEXT, cached_at REAL, PRIMARY KEY (library, key)
+)
+"""
+
+
+@dataclass(slots=True)
+class LibraryTrack:
+    """Minimal track record. Attribute names follow plexapi's Track so it can
+    stand in for one wherever only these fields are read."""
+    ratingKey: int
+    title: str
+    grandparentTitle: str
+    parentTitle: str
+    duration: Optional[int]
+    guids: Tuple[str, ...]
+
+
+def normalize_id(guid: Optional[str]) -> Optional[str]:
+    """Canonical identifier key: 'mbid://<uuid>', 'isrc://<code>', or the lowercased guid"""
+    if not guid:
+        return None
+    guid = guid.strip().lower()
+    scheme = guid.split('://', 1)[0]
+    if scheme == 'mbid' or 'musicbrainz' in scheme:
+        match = _UUID_RE.search(guid)
+        return f"mbid://{match.group(0)}" if match else None
+    return guid.split('?', 1)[0]
+
+
+def track_identifiers(track: Track) -> List[str]:
+    """Identifier keys a parsed/Spotify track carries (may be empty)"""
+    ids = []
+    if track.mbid:
+        ids.append(normalize_id(f"mbid://{track.mbid}"))
+    if track.isrc:
+        ids.append(f"isrc://{track.isrc.strip().lower()}")
+    return [i for i in ids if i]
+
+
+def _from_plex(plex_track) -> LibraryTrack:
+    # Read the listing XML directly: plexapi reloads a partial object (one HTTP
+    # request per track) whenever an attribute like guids or duration is empty
+    data = plex_track._data
+    guids = [g.attrib.get('id') for g in data.findall('Guid')]
+    guids.append(data.attrib.get('guid'))
+    duration = data.attrib.get('duration')
+    return LibraryTrack(
+        ratingKey=int(data.attrib['ratingKey']),
+        title=data.attrib.get('title', ""),
+        grandparentTitle=data.attrib.get('grandparentTitle', ""),
+        parentTitle=data.attrib.get('parentTitle', ""),
+        duration=int(duration) if duration else None,
+        guids=tuple(g for g in (normalize_id(g) for g in guids) if g)
+    )
+
+
+def iter_library_tracks(library) -> Iterator[LibraryTrack]:
+    """Page through every track of a section (GUIDs included), one page in memory at a time"""
+    start = 0
+    while True:
+        page = library.searchTracks(
+            container_start=start, container_size=SNAPSHOT_PAGE_SIZE, maxresults=SNAPSHOT_PAGE_SIZE
+        )
+        for plex_track in page:
+            yield _from_plex(plex_track)
+        if len(page) < SNAPSHOT_PAGE_SIZE:
+            break
+        start += SNAPSHOT_PAGE_SIZE
+
+
+class LibrarySnapshot:
+    """Tracks of a library section by ratingKey, with an identifier -> ratingKey index.
+    Kept in the shared store so every worker reads the same snapshot without a
+    copy of its own. Each build writes a new generation and then switches to
+    it, so lookups keep working while a rebuild is in progress."""
+
+    def __init__(self, store: SharedStore, generation: str, built_at: float, tracks: int, identifiers: int):
+        self._store = store
+        self.generation = generation
+        self.built_at = built_at
+        self.tracks = tracks
+        self.identifiers = identifiers
+
+    @classmethod
+    def load(cls, store: SharedStore, library: str) -> Optional["LibrarySnapshot"]:
+        """Current snapshot of a library (None if never built)"""
+        row = store.connection().execute(
+            "SELECT generation, built_at, tracks, identifiers FROM library_snapshots WHERE library = ?",
+            (library,)
+        ).fetchone()
+        return cls(store, *row) if row else None
+
+    @classmethod
+    def build(cls, store: SharedStore, library: str, sections: list) -> "LibrarySnapshot":
+        """Snapshot every track of the Plex sections (merged, in priority order)
+        and make it the current one"""
+        started = time.time()
+        _drop_orphans(store, library)
+        generation = f"{library}@{time.time_ns()}"
+        tracks = 0
+        all_tracks = chain.from_iterable(iter_library_tracks(section) for section in sections)
+        try:
+            for page in _batched(all_tracks, SNAPSHOT_PAGE_SIZE):
+                # One short write per page so other workers aren't blocked for the whole build
+                with store.transaction() as conn:
+                    conn.executemany(
+                        "INSERT OR REPLACE INTO library_tracks VALUES (?, ?, ?, ?, ?, ?)",
+                        [(generation, t.ratingKey, t.title, t.grandparentTitle, t.parentTitle, t.duration)
+                         for t in page]
+                    )
+                    # First track to claim an identifier keeps it, so higher-priority sections win
+                    conn.executemany(
+                        "INSERT OR IGNORE INTO library_ids VALUES (?, ?, ?)",
+                        [(generation, guid, t.ratingKey) for t in page for guid in t.guids]
+                    )
+                tracks += len(page)
+        except BaseException:
+            _drop_generation(store, generation)
+            raise
+
+        with store.transaction() as conn:
+            identifiers = conn.execute(
+                "SELECT COUNT(*) FROM library_ids WHERE generation = ?", (generation,)
+            ).fetchone()[0]
+            built_at = time.time()
+            old = conn.execute(
+                "SELECT generation FROM library_snapshots WHERE library = ?", (library,)
+            ).fetchone()
+            conn.execute(
+                "INSERT OR REPLACE INTO library_snapshots VALUES (?, ?, ?, ?, ?)",
+                (library, generation, built_at, tracks, identifiers)
+            )
+        # Readers moved to the new generation with the switch; clear the old one
+        # in small writes instead of holding the write lock for all its rows
+        if old:
+            _drop_generation(store, old[0])
+
+        logger.info(
+            "Library snapshot of %r: %d tracks, %d identifiers in %.1fs",
+            ", ".join(section.title for section in sections), tracks, identifiers, time.time() - started
+        )
+        return cls(store, generation, built_at, tracks, identifiers)
+
+    def lookup(self, identifiers: Iterable[str]) -> Optional[LibraryTrack]:
+        """First track matching any of the identifiers"""
+        conn = self._store.connection()
+        for identifier in identifiers:
+            row = conn.execute(
+                "SELECT t.rating_key, t.title, t.grandparent_title, t.parent_title, t.duration "
+                "FROM library_ids i JOIN library_tracks t "
+                "ON t.generation = i.generation AND t.rating_key = i.rating_key "
+                "WHERE i.generation = ? AND i.id = ?",
+                (self.generation, identifier)
+            ).fetchone()
+            if row:
+                return LibraryTrack(*row, guids=())
+        return None
+
+    def __len__(self) -> int:
+        return self.tracks
+
+
+class MatchCache:
+    """Search-based matches by normalized artist and title, shared by all workers.
+    Only found tracks are cached: a miss may turn into a hit once a download lands.
+    Writes are batched and best effort: a match that can't be saved is searched again."""
+
+    def __init__(self, store: SharedStore, ttl: float = MATCH_CACHE_TTL):
+        self._store = store
+        self.ttl = ttl
+        # Matches not written yet, by (library, key)
+        self._pending: Dict[Tuple[str, str], tuple] = {}
+        self._pending_lock = threading.Lock()
+        self._flushed_at = time.time()
+
+    def get(self, library: str, key: str) -> Optional[Tuple[LibraryTrack, str]]:
+        """(track, match_type) or None"""
+        with self._pending_lock:
+            row = self._pending.get((library, key))
+        if row:
+            return LibraryTrack(*row[2:7], guids=()), row[7]
+        row = self._store.connection().execute(
+            "SELECT rating_key, title, grandparent_title, parent_title, duration, match_type "
+            "FROM match_cache WHERE library = ? AND key = ? AND cached_at >= ?",
+            (library, key, time.time() - self.ttl)
+        ).fetchone()
+        if not row:
+            return None
+        return LibraryTrack(*row[:5], guids=()), row[5]
+
+    def put(self, library: str, key: str, plex_track, match_type: str):
+        """Queue a match; it's written with the next batch"""
+        row = (library, key, int(plex_track.ratingKey), plex_track.title or "",
+               plex_track.grandparentTitle or "", plex_track.parentTitle or "",
+               plex_track.duration, match_type, time.time())
+        with self._pending_lock:
+            self._pending[(library, key)] = row
+            due = (len(self._pending) >= MATCH_CACHE_BATCH
+                   or time.time() - self._flushed_at >= MATCH_CACHE_FLUSH_INTERVAL)
+        if due:
+            self.flush()
+
+    def flush(self):
+        """Write queued matches; a busy database only costs the cache entries"""
+        with self._pending_lock:
+            rows = list(self._pending.values())
+            self._pending.clear()
+            self._flushed_at = time.time()
+        if not rows:
+            return
+        try:
+            with self._store.transaction() as conn:
+                conn.executemany("INSERT OR REPLACE INTO match_cache VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)", rows)
+        except sqlite3.OperationalError as e:
+            logger.warning("Could not save %d cached matches: %s", len(rows), e)
+
+    def clear(self, library: str):
+        """Forget a library's matches (after its contents changed)"""
+        with self._pending_lock:
+            for pending in [k for k in self._pending if k[0] == library]:
+                del self._pending[pending]
+        with self._store.transaction() as conn:
+            conn.execute("DELETE FROM match_cache WHERE library = ?", (library,))
+
+
+def _batched(items: Iterable, size: int) -> Iterator[list]:
+    iterator = iter(items)
+    while True:
+        batch = list(islice(iterator, size))
+        if not batch:
+            return
+        yield batch
+
+
+def _drop_generation(store: SharedStore, generation: str):
+    """Delete a snapshot generation's rows, a batch per transaction"""
+    for table in ("library_tracks", "library_ids"):
+        while True:
+            with store.transaction() as conn:
+                deleted = conn.execute(
+                    f"DELETE FROM {table} WHERE rowid IN "
+                    f"(SELECT rowid FROM {table} WHERE generation = ? LIMIT ?)",
+                    (generation, SNAPSHOT_DELETE_BATCH)
+                ).rowcount
+            if deleted < SNAPSHOT_DELETE_BATCH:
+                break
+
+
+def _drop_orphans(store: SharedStore, library: str):
+    """Delete generations of the library left behind by builds that were killed"""
+    prefix = f"{library}@"
+    conn = store.connection()
+    current = conn.execute(
+        "SELECT generation FROM library_snapshots WHERE library = ?", (library,)
+    ).fetchone()
+    generations = {
+        generation for generation, in conn.execute(
+            "SELECT DISTINCT generation FROM library_tracks WHERE substr(generation, 1, ?) = ?",
+            (len(prefix), prefix)
+        )
+    }
+    cutoff = time.time_ns() - SNAPSHOT_ORPHAN_AGE * 10**9
+    for generation in generations - {current and current[0]}:
+        started_ns = generation[len(prefix):]
+        if started_ns.isdigit() and int(started_ns) < cutoff:
+            logger.info("Dropping abandoned library snapshot %s", generation)
+            _drop_generation(store, generation)
+
+
+_schema_ready = False
+
+
+def library_store() -> SharedStore:
+    """The shared store, with the snapshot and match cache tables created"""
+    global _schema_ready
+    store = get_store()
+    if not _schema_ready:
+        store.executescript(_SCHEMA)
+        _schema_ready = True
+    return store
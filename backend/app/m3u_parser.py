@@ -1,34 +1,113 @@
 import os
 import re
+import sys
+from array import array
+from collections.abc import Sequence
 from pathlib import Path
-from typing import List, Optional
+from typing import Iterable, Iterator, List, Optional
 from dataclasses import dataclass
 
 
-@dataclass
+@dataclass(slots=True)
 class Track:
     filename: str
     path: str
     title: Optional[str] = None
     artist: Optional[str] = None
     duration: Optional[int] = None
+    album: Optional[str] = None
+    mbid: Optional[str] = None  # MusicBrainz recording ID from embedded tags
+    isrc: Optional[str] = None
+
+
+# Sentinel for "no duration" in TrackColumns' int64 duration column
+_NO_DURATION = -2 ** 63
+
+
+def _intern(s: Optional[str]) -> Optional[str]:
+    return sys.intern(s) if s else s
+
+
+class TrackColumns(Sequence):
+    """Compact, column-oriented list of tracks.
+
+    Stores one list per field instead of one object per track. Track paths are
+    split into an interned folder prefix and the file name, artists are
+    interned, and durations live in an int64 array. Items are materialized as
+    Track on access, so callers see the same fields as with a plain list.
+    """
+    __slots__ = ('_dirs', '_names', '_filenames', '_titles', '_artists', '_durations',
+                 '_albums', '_mbids', '_isrcs')
+
+    def __init__(self, tracks: Iterable[Track] = ()):
+        self._dirs = []
+        self._names = []
+        self._filenames = []  # None when equal to the path's file name
+        self._titles = []
+        self._artists = []
+        self._durations = array('q')
+        self._albums = []
+        self._mbids = []
+        self._isrcs = []
+        for track in tracks:
+            self.append(track)
+
+    def append(self, track: Track):
+        cut = track.path.rfind(os.sep) + 1
+        name = track.path[cut:]
+        self._dirs.append(sys.intern(track.path[:cut]))
+        self._names.append(name)
+        self._filenames.append(None if track.filename == name else track.filename)
+        self._titles.append(track.title)
+        self._artists.append(_intern(track.artist))
+        self._durations.append(_NO_DURATION if track.duration is None else track.duration)
+        self._albums.append(_intern(track.album))
+        self._mbids.append(track.mbid)
+        self._isrcs.append(track.isrc)
+
+    def __len__(self) -> int:
+        return len(self._names)
+
+    def __getitem__(self, index):
+        if isinstance(index, slice):
+            return [self[i] for i in range(*index.indices(len(self)))]
+        name = self._names[index]
+        filename = self._filenames[index]
+        duration = self._durations[index]
+        return Track(
+            filename=name if filename is None else filename,
+            path=self._dirs[index] + name,
+            title=self._titles[index],
+            artist=self._artists[index],
+            duration=None if duration == _NO_DURATION else duration,
+            album=self._albums[index],
+            mbid=self._mbids[index],
+            isrc=self._isrcs[index]
+        )
+
+    def __repr__(self) -> str:
+        return f"TrackColumns({len(self)} tracks)"
 
 
 @dataclass
 class Playlist:
     name: str
     path: str
-    tracks: List[Track]
+    tracks: Iterable[Track]  # a list, or a lazy iterator from open_m3u()
     folder: str
 
 
-def parse_m3u(m3u_path: str) -> Playlist:
-    """Parse an m3u file and return playlist info"""
-    tracks = []
-    current_title = None
-    current_artist = None
-    current_duration = None
-    
+@dataclass
+class PlaylistSummary:
+    """Playlist header info for listing views (no Track objects)"""
+    name: str
+    path: str
+    folder: str
+    track_count: int
+
+
+def _playlist_name(m3u_path: str) -> str:
+    """Playlist name from the m3u filename, falling back to its folder name"""
     folder = os.path.dirname(m3u_path)
     playlist_name = os.path.basename(folder)
     
@@ -38,8 +117,40 @@ def parse_m3u(m3u_path: str) -> Playlist:
     m3u_name_clean = re.sub(r'^[^\w\s]+\s*', '', m3u_name).strip()
     if m3u_name_clean:
         playlist_name = m3u_name_clean
+    return playlist_name
+
+
+def summarize_m3u(m3u_path: str) -> PlaylistSummary:
+    """Count playlist entries by scanning raw bytes, without building Tracks.
+    Counts the same lines parse_m3u turns into tracks: non-empty, not a comment.
+    """
+    count = 0
+    with open(m3u_path, 'rb') as f:
+        # Skip a UTF-8 BOM so '#EXTM3U' on the first line is seen as a comment
+        if f.read(3) != b'\xef\xbb\xbf':
+            f.seek(0)
+        for line in f:
+            line = line.strip()
+            if line and line[0] != 0x23:  # b'#'
+                count += 1
     
-    with open(m3u_path, 'r', encoding='utf-8', errors='ignore') as f:
+    return PlaylistSummary(
+        name=_playlist_name(m3u_path),
+        path=m3u_path,
+        folder=os.path.dirname(m3u_path),
+        track_count=count
+    )
+
+
+def iter_m3u(m3u_path: str) -> Iterator[Track]:
+    """Yield tracks of an m3u file one at a time (constant memory)"""
+    current_title = None
+    current_artist = None
+    current_duration = None
+    
+    folder = os.path.dirname(m3u_path)
+    
+    with open(m3u_path, 'r', encoding='utf-8-sig', errors='ignore') as f:
         for line in f:
             line = line.strip()
             
@@ -83,31 +194,42 @@ def parse_m3u(m3u_path: str) -> Playlist:
                     else:
                         current_title = name_clean
                 
-                tracks.append(Track(
+                yield Track(
                     filename=filename,
                     path=track_path,
                     title=current_title,
-                    artist=current_artist,
+                    artist=_intern(current_artist),
                     duration=current_duration
-                ))
+                )
                 
                 # Reset for next track
                 current_title = None
                 current_artist = None
                 current_duration = None
-    
+
+
+def open_m3u(m3u_path: str) -> Playlist:
+    """Playlist whose tracks are read lazily; iterate them only once"""
     return Playlist(
-        name=playlist_name,
+        name=_playlist_name(m3u_path),
         path=m3u_path,
-        tracks=tracks,
-        folder=folder
+        tracks=iter_m3u(m3u_path),
+        folder=os.path.dirname(m3u_path)
     )
 
 
-def scan_playlists(root_path: str) -> List[Playlist]:
-    """Scan directory recursively for .m3u and .m3u8 playlists.
-    Includes playlists even with 0 tracks so they are visible (e.g. m3u8 with URLs).
-    """
+def parse_m3u(m3u_path: str) -> Playlist:
+    """Parse an m3u file and return playlist info"""
+    return Playlist(
+        name=_playlist_name(m3u_path),
+        path=m3u_path,
+        tracks=TrackColumns(iter_m3u(m3u_path)),
+        folder=os.path.dirname(m3u_path)
+    )
+
+
+def _scan(root_path: str, parse) -> list:
+    """Walk root_path and apply parse() to every unique .m3u/.m3u8 file"""
     playlists = []
     seen_paths = set()
 
@@ -120,9 +242,20 @@ def scan_playlists(root_path: str) -> List[Playlist]:
                     if m3u_path_norm in seen_paths:
                         continue
                     seen_paths.add(m3u_path_norm)
-                    playlist = parse_m3u(m3u_path)
-                    playlists.append(playlist)
+                    playlists.append(parse(m3u_path))
                 except Exception as e:
                     print(f"Error parsing {m3u_path}: {e}")
 
     return playlists
+
+
+def scan_playlists(root_path: str) -> List[Playlist]:
+    """Scan directory recursively for .m3u and .m3u8 playlists.
+    Includes playlists even with 0 tracks so they are visible (e.g. m3u8 with URLs).
+    """
+    return _scan(root_path, parse_m3u)
+
+
+def scan_playlist_summaries(root_path: str) -> List[PlaylistSummary]:
+    """Like scan_playlists, but only counts entries (fast path for listing)"""
+    return _scan(root_path, summarize_m3u)
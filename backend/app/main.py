@@ -1,18 +1,26 @@
 from fastapi import FastAPI, HTTPException, BackgroundTasks, Depends
 from fastapi.middleware.cors import CORSMiddleware
 from fastapi.staticfiles import StaticFiles
-from fastapi.responses import FileResponse
+from fastapi.responses import FileResponse, StreamingResponse, JSONResponse
 from pydantic import BaseModel
 from typing import List, Optional, Dict
+import json
 import logging
 import os
 
 logger = logging.getLogger(__name__)
 
-from .config import get_settings, save_settings, load_settings
-from .m3u_parser import scan_playlists, parse_m3u, Playlist, Track
-from .plex_service import PlexService
-from . import plex_auth
+from .config import get_settings, load_settings, edit_settings
+from .m3u_parser import scan_playlist_summaries, open_m3u, Playlist, Track, TrackColumns
+from .plex_service import PlexService, MatchResult
+from .tag_reader import enrich_tracks, get_tag_index
+from . import admission, plex_auth, plex_connection, jobs
+from .health import registry as health_registry, CircuitOpenError
+from .http_client import close_sessions
+from .shared_store import get_store
+from .bulk_import import run_spotify_bulk_import
+from .acquisition import run_acquisition
+from .download_tracker import tracker as download_tracker
 from .spotify_service import SpotifyService, is_spotify_available, is_spotify_configured, get_spotify_service
 
 app = FastAPI(title="Plex Playlist Importer", version="1.0.0")
@@ -27,12 +35,31 @@ app.add_middleware(
 )
 
 
+@app.on_event("startup")
+def start_background_services():
+    health_registry.start()
+    download_tracker.configure(get_plex_service)
+
+
+@app.on_event("shutdown")
+def close_http_sessions():
+    health_registry.stop()
+    close_sessions()
+
+
+@app.exception_handler(CircuitOpenError)
+def circuit_open_handler(request, exc: CircuitOpenError):
+    return JSONResponse(status_code=503, content={"detail": str(exc)})
+
+
 # Pydantic models
 class SettingsModel(BaseModel):
     plex_url: str
     plex_token: str
     music_library_name: str
     playlists_path: str
+    # Omitted: keep the stored list
+    music_library_names: Optional[List[str]] = None
 
 
 class ConnectionTest(BaseModel):
@@ -85,21 +112,45 @@ def get_plex_service() -> PlexService:
     global _plex_service
     settings = get_settings()
     
-    if _plex_service is None or _plex_service.url != settings.plex_url:
+    url = plex_connection.best_url(settings.plex_url, settings.plex_connections, settings.plex_token)
+    
+    # Reconnect only when the Plex settings themselves changed
+    if (
+        _plex_service is None
+        or (_plex_service.url, _plex_service.token, _plex_service.library_name, _plex_service.library_names)
+        != (url, settings.plex_token, settings.music_library_name,
+            settings.music_library_names or [settings.music_library_name])
+    ):
+        if not health_registry.allow("plex"):
+            raise HTTPException(status_code=503, detail="Plex server is unavailable")
         _plex_service = PlexService(
-            url=settings.plex_url,
+            url=url,
             token=settings.plex_token,
-            library_name=settings.music_library_name
+            library_name=settings.music_library_name,
+            library_names=settings.music_library_names
         )
         success, msg = _plex_service.connect()
         if not success:
             logger.warning("Plex connection failed: %s", msg)
             _plex_service = None
+            # A bad token or library name is a settings problem, not an outage
+            if msg.startswith("Connection failed"):
+                health_registry.record_failure("plex", msg)
+                plex_connection.invalidate()
             raise HTTPException(status_code=500, detail=msg)
+        health_registry.record_success("plex")
     
     return _plex_service
 
 
+# ============ Health ============
+
+@app.get("/api/health")
+def get_health():
+    """Cached status of external services (probed in the background)"""
+    return health_registry.all()
+
+
 # ============ Settings endpoints ============
 
 @app.get("/api/settings")
@@ -114,27 +165,21 @@ def get_current_settings():
 
 
 @app.post("/api/settings")
-def update_settings(settings: SettingsModel):
+def update_settings(settings: SettingsModel, background_tasks: BackgroundTasks):
     """Update settings (merge with existing so Spotify/SLSKD etc. are not lost)"""
-    existing = load_settings()
-    data = settings.model_dump()
-    # Keep existing token if not changed
-    if data.get("plex_token", "").startswith("***"):
-        data["plex_token"] = existing.get("plex_token", "")
-    # Merge: keep all keys not in SettingsModel (spotify_*, slskd_*, client_id)
-    for key in list(existing.keys()):
-        if key not in data:
-            data[key] = existing[key]
-    save_settings(data)
-    
-    # Reset plex service cache
-    global _plex_service
-    _plex_service = None
+    data = settings.model_dump(exclude_none=True)
+    with edit_settings() as existing:
+        # Keep existing token if not changed
+        if data.get("plex_token", "").startswith("***"):
+            data["plex_token"] = existing.get("plex_token", "")
+        # Merge: keep all keys not in SettingsModel (spotify_*, slskd_*, client_id)
+        existing.update(data)
+    _schedule_server_connections(existing, background_tasks)
     
     return {"status": "ok", "message": "Settings saved"}
 
 
-@app.post("/api/test-connection")
+@app.post("/api/test-connection", dependencies=[Depends(admission.external)])
 def test_connection(conn: ConnectionTest):
     """Test Plex connection"""
     service = PlexService(url=conn.plex_url, token=conn.plex_token)
@@ -151,7 +196,7 @@ def test_connection(conn: ConnectionTest):
         raise HTTPException(status_code=400, detail=msg)
 
 
-@app.get("/api/libraries")
+@app.get("/api/libraries", dependencies=[Depends(admission.external)])
 def get_libraries(service: PlexService = Depends(get_plex_service)):
     """Get available music libraries"""
     try:
@@ -163,13 +208,43 @@ def get_libraries(service: PlexService = Depends(get_plex_service)):
         raise HTTPException(status_code=500, detail=str(e))
 
 
+@app.get("/api/library/snapshot")
+def get_library_snapshot(service: PlexService = Depends(get_plex_service)):
+    """Status of the shared library snapshot used for exact ID matching"""
+    snapshot = service.snapshot
+    return {
+        "built": snapshot is not None,
+        "tracks": len(snapshot) if snapshot else 0,
+        "identifiers": snapshot.identifiers if snapshot else 0,
+        "built_at": snapshot.built_at if snapshot else None
+    }
+
+
+@app.post("/api/library/snapshot", dependencies=[Depends(admission.heavy)])
+def build_library_snapshot(service: PlexService = Depends(get_plex_service)):
+    """(Re)build the library snapshot - fetches every track of the music library"""
+    try:
+        snapshot = service.build_snapshot()
+    except Exception as e:
+        logger.exception("Failed to build library snapshot")
+        raise HTTPException(status_code=500, detail=str(e))
+    return {
+        "built": True,
+        "tracks": len(snapshot),
+        "identifiers": snapshot.identifiers,
+        "built_at": snapshot.built_at
+    }
+
+
 # ============ Plex OAuth endpoints ============
 
-# Store pending auth sessions (in production, use Redis or database)
-_pending_auth: Dict[str, dict] = {}
+# Pending auth sessions live in the shared store: the PIN may be checked by another worker
+_PENDING_AUTH = "pending_auth"
+# Plex PINs expire after 30 minutes
+PENDING_AUTH_TTL = 1800
 
 
-@app.post("/api/auth/start")
+@app.post("/api/auth/start", dependencies=[Depends(admission.external)])
 def start_auth():
     """Start Plex OAuth flow - returns PIN and auth URL"""
     client_id = plex_auth.generate_client_id()
@@ -179,11 +254,11 @@ def start_auth():
         raise HTTPException(status_code=500, detail=error)
     
     # Store the pending auth
-    _pending_auth[pin.code] = {
+    get_store().put(_PENDING_AUTH, pin.code, {
         "pin_id": pin.id,
         "client_id": client_id,
         "code": pin.code
-    }
+    }, ttl=PENDING_AUTH_TTL)
     
     return {
         "code": pin.code,
@@ -193,13 +268,13 @@ def start_auth():
     }
 
 
-@app.get("/api/auth/check/{code}")
+@app.get("/api/auth/check/{code}", dependencies=[Depends(admission.external)])
 def check_auth(code: str):
     """Check if PIN has been authorized"""
-    if code not in _pending_auth:
+    session = get_store().get(_PENDING_AUTH, code)
+    if not session:
         raise HTTPException(status_code=404, detail="Auth session not found")
     
-    session = _pending_auth[code]
     token, error = plex_auth.check_pin(session["pin_id"], session["client_id"])
     
     if error:
@@ -213,7 +288,7 @@ def check_auth(code: str):
         servers, servers_error = plex_auth.get_servers(token, session["client_id"])
         
         # Clean up pending auth
-        del _pending_auth[code]
+        get_store().delete(_PENDING_AUTH, code)
         
         return {
             "authorized": True,
@@ -231,7 +306,7 @@ def check_auth(code: str):
 
 
 @app.post("/api/auth/save")
-def save_auth_token(data: dict):
+def save_auth_token(data: dict, background_tasks: BackgroundTasks):
     """Save the authenticated token and server to settings"""
     token = data.get("token")
     server_url = data.get("server_url")
@@ -241,23 +316,41 @@ def save_auth_token(data: dict):
         raise HTTPException(status_code=400, detail="Token is required")
     
     # Load existing settings and update
-    settings = load_settings()
-    settings["plex_token"] = token
-    settings["client_id"] = client_id
-    
-    if server_url:
-        settings["plex_url"] = server_url
-    
-    save_settings(settings)
+    with edit_settings() as settings:
+        settings["plex_token"] = token
+        settings["client_id"] = client_id
+        
+        if server_url:
+            settings["plex_url"] = server_url
     
-    # Reset plex service cache
-    global _plex_service
-    _plex_service = None
+    _schedule_server_connections(settings, background_tasks)
     
     return {"status": "ok", "message": "Authentication saved"}
 
 
-@app.get("/api/auth/servers")
+def _schedule_server_connections(settings: dict, background_tasks: BackgroundTasks):
+    """Look up the server's other URIs after the response (plex.tv may be slow)
+    unless the stored ones already belong to plex_url"""
+    url, token = settings.get("plex_url"), settings.get("plex_token")
+    if not url or not token:
+        return
+    if any(c.get("uri") == url for c in settings.get("plex_connections", [])):
+        return
+    client_id = settings.get("client_id") or plex_auth.generate_client_id()
+    background_tasks.add_task(_remember_server_connections, url, token, client_id)
+
+
+def _remember_server_connections(url: str, token: str, client_id: str):
+    """Store every URI of the server url points at, so connecting can race them"""
+    servers, _ = plex_auth.get_servers(token, client_id)
+    server = next((s for s in servers if any(c["uri"] == url for c in s["connections"])), None)
+    with edit_settings() as settings:
+        # Settings may have changed while plex.tv was answering
+        if (settings.get("plex_url"), settings.get("plex_token")) == (url, token):
+            settings["plex_connections"] = server["connections"] if server else []
+
+
+@app.get("/api/auth/servers", dependencies=[Depends(admission.external)])
 def get_servers():
     """Get list of user's Plex servers using saved token"""
     settings = load_settings()
@@ -278,19 +371,37 @@ def get_servers():
 @app.post("/api/auth/logout")
 def logout():
     """Clear authentication"""
-    settings = load_settings()
-    settings["plex_token"] = ""
-    settings.pop("client_id", None)
-    save_settings(settings)
-    
-    global _plex_service
-    _plex_service = None
+    with edit_settings() as settings:
+        settings["plex_token"] = ""
+        settings.pop("client_id", None)
+        settings.pop("plex_connections", None)
     
     return {"status": "ok", "message": "Logged out"}
 
 
 # ============ Playlist endpoints ============
 
+def _open_playlist(path: str) -> Playlist:
+    """open_m3u, with embedded file tags applied when enabled in settings"""
+    playlist = open_m3u(path)
+    settings = get_settings()
+    if settings.read_embedded_tags:
+        playlist.tracks = enrich_tracks(playlist.tracks, get_tag_index(), settings.tag_read_workers)
+    return playlist
+
+
+def _track_info(match: MatchResult) -> TrackInfo:
+    return TrackInfo(
+        filename=match.track.filename,
+        title=match.track.title,
+        artist=match.track.artist,
+        matched=match.matched,
+        match_type=match.match_type,
+        plex_title=match.plex_track.title if match.plex_track else None,
+        plex_artist=match.plex_track.grandparentTitle if match.plex_track else None
+    )
+
+
 @app.get("/api/playlists", response_model=List[PlaylistInfo])
 def list_playlists():
     """Scan and list all m3u playlists"""
@@ -303,7 +414,7 @@ def list_playlists():
             detail=f"Path not found: {playlists_path}. Mount your music root in Docker (e.g. -v /host/music:/music) and set this to /music."
         )
     
-    playlists = scan_playlists(playlists_path)
+    playlists = scan_playlist_summaries(playlists_path)
     root = os.path.normpath(playlists_path)
 
     result = []
@@ -321,40 +432,29 @@ def list_playlists():
                 name=p.name,
                 path=p.path,
                 folder=p.folder,
-                track_count=len(p.tracks),
+                track_count=p.track_count,
                 group=group,
             )
         )
     return result
 
 
-@app.get("/api/playlists/preview")
+@app.get("/api/playlists/preview", dependencies=[Depends(admission.heavy)])
 def preview_playlist(path: str):
     """Preview a specific playlist with track matching"""
     if not os.path.exists(path):
         raise HTTPException(status_code=404, detail="Playlist file not found")
     
-    playlist = parse_m3u(path)
+    playlist = _open_playlist(path)
     
     try:
         service = get_plex_service()
         result = service.preview_import(playlist)
         
-        tracks = []
-        for match in result.matches:
-            track_info = TrackInfo(
-                filename=match.track.filename,
-                title=match.track.title,
-                artist=match.track.artist,
-                matched=match.matched,
-                match_type=match.match_type,
-                plex_title=match.plex_track.title if match.plex_track else None,
-                plex_artist=match.plex_track.grandparentTitle if match.plex_track else None
-            )
-            tracks.append(track_info)
+        tracks = [_track_info(match) for match in result.matches]
         
         # #region agent log
-        _resp = PlaylistInfo(name=playlist.name, path=playlist.path, folder=playlist.folder, track_count=len(playlist.tracks), tracks=tracks)
+        _resp = PlaylistInfo(name=playlist.name, path=playlist.path, folder=playlist.folder, track_count=result.total_tracks, tracks=tracks)
         try:
             _log = {"hypothesisId":"H1","location":"main.py:preview_playlist","message":"preview response","data":{"keys":list(_resp.model_dump().keys()),"tracks_len":len(tracks),"tracks_type":type(_resp.tracks).__name__},"timestamp":__import__("time").time()*1000}
             open("/cursor-debug/debug-459f84.log", "a").write(__import__("json").dumps(_log) + "\n")
@@ -368,7 +468,7 @@ def preview_playlist(path: str):
             TrackInfo(filename=t.filename, title=t.title, artist=t.artist, matched=False, match_type="unknown")
             for t in playlist.tracks
         ]
-        res_fallback = PlaylistInfo(name=playlist.name, path=playlist.path, folder=playlist.folder, track_count=len(playlist.tracks), tracks=fallback_tracks)
+        res_fallback = PlaylistInfo(name=playlist.name, path=playlist.path, folder=playlist.folder, track_count=len(fallback_tracks), tracks=fallback_tracks)
         # #region agent log
         try:
             _log = {"hypothesisId":"H1","location":"main.py:preview_playlist_fallback","message":"preview fallback","data":{"tracks_len":len(fallback_tracks)},"timestamp":__import__("time").time()*1000}
@@ -379,13 +479,32 @@ def preview_playlist(path: str):
         # #endregion
 
 
-@app.post("/api/playlists/import", response_model=ImportResultModel)
+@app.get("/api/playlists/preview/stream")
+def preview_playlist_stream(path: str, slot: admission.Slot = Depends(admission.heavy)):
+    """Preview as NDJSON: a header line, then one line per track as soon as it is matched"""
+    if not os.path.exists(path):
+        raise HTTPException(status_code=404, detail="Playlist file not found")
+    
+    service = get_plex_service()
+    playlist = _open_playlist(path)
+    
+    def generate():
+        yield json.dumps({"name": playlist.name, "path": playlist.path, "folder": playlist.folder}) + "\n"
+        for match in service.iter_matches(playlist.tracks):
+            yield _track_info(match).model_dump_json() + "\n"
+    
+    # Matching happens while the body streams, so the slot is held until it's sent
+    return StreamingResponse(slot.stream(generate()), media_type="application/x-ndjson",
+                             background=slot.hold())
+
+
+@app.post("/api/playlists/import", response_model=ImportResultModel, dependencies=[Depends(admission.heavy)])
 def import_playlist(request: ImportRequest, service: PlexService = Depends(get_plex_service)):
     """Import a playlist to Plex"""
     if not os.path.exists(request.playlist_path):
         raise HTTPException(status_code=404, detail="Playlist file not found")
     
-    playlist = parse_m3u(request.playlist_path)
+    playlist = _open_playlist(request.playlist_path)
     result = service.import_playlist(playlist, overwrite=request.overwrite)
     
     if result.error and not result.created:
@@ -400,7 +519,7 @@ def import_playlist(request: ImportRequest, service: PlexService = Depends(get_p
     )
 
 
-@app.post("/api/playlists/import-batch")
+@app.post("/api/playlists/import-batch", dependencies=[Depends(admission.heavy)])
 def import_batch(request: BatchImportRequest, service: PlexService = Depends(get_plex_service)):
     """Import multiple playlists"""
     results = []
@@ -416,7 +535,7 @@ def import_batch(request: BatchImportRequest, service: PlexService = Depends(get
             ))
             continue
         
-        playlist = parse_m3u(path)
+        playlist = _open_playlist(path)
         result = service.import_playlist(playlist, overwrite=request.overwrite)
         
         results.append(ImportResultModel(
@@ -434,7 +553,7 @@ def import_batch(request: BatchImportRequest, service: PlexService = Depends(get
     }
 
 
-@app.get("/api/plex-playlists")
+@app.get("/api/plex-playlists", dependencies=[Depends(admission.external)])
 def get_plex_playlists(service: PlexService = Depends(get_plex_service)):
     """Get existing Plex playlists"""
     try:
@@ -457,6 +576,11 @@ class SpotifyImportRequest(BaseModel):
     overwrite: bool = False
 
 
+class SpotifyBulkImportRequest(BaseModel):
+    urls: List[str]
+    overwrite: bool = False
+
+
 class SpotifyCredentials(BaseModel):
     client_id: str
     client_secret: str
@@ -485,10 +609,9 @@ def spotify_status():
 @app.post("/api/spotify/credentials")
 def save_spotify_credentials(creds: SpotifyCredentials):
     """Save Spotify API credentials"""
-    settings = load_settings()
-    settings["spotify_client_id"] = creds.client_id
-    settings["spotify_client_secret"] = creds.client_secret
-    save_settings(settings)
+    with edit_settings() as settings:
+        settings["spotify_client_id"] = creds.client_id
+        settings["spotify_client_secret"] = creds.client_secret
     return {"status": "ok", "message": "Spotify credentials saved"}
 
 
@@ -505,7 +628,7 @@ def get_spotify_credentials():
     }
 
 
-@app.post("/api/spotify/preview")
+@app.post("/api/spotify/preview", dependencies=[Depends(admission.heavy)])
 def preview_spotify_playlist(request: SpotifyUrlRequest):
     """Preview a Spotify playlist - get tracks and match with Plex"""
     if not is_spotify_available():
@@ -516,22 +639,17 @@ def preview_spotify_playlist(request: SpotifyUrlRequest):
     
     try:
         spotify = get_spotify_service()
-        playlist = spotify.get_playlist(request.url)
+        # Tracks arrive as the playlist is downloaded, so matching starts right away
+        info = {}
+        sp_tracks = spotify.iter_tracks(request.url, info)
         
         # Try to match tracks with Plex
         tracks_info = []
         try:
             plex = get_plex_service()
-            for sp_track in playlist.tracks:
-                # Create Track object for matching
-                track_obj = Track(
-                    filename=f"{sp_track.artist} - {sp_track.title}",
-                    path="",
-                    title=sp_track.title,
-                    artist=sp_track.artist
-                )
+            for sp_track in sp_tracks:
                 # Search in Plex
-                match_result = plex.find_track(track_obj)
+                match_result = plex.find_track(sp_track.to_track())
                 plex_track = match_result.plex_track if match_result.matched else None
                 tracks_info.append({
                     "title": sp_track.title,
@@ -543,9 +661,10 @@ def preview_spotify_playlist(request: SpotifyUrlRequest):
                     "plex_title": plex_track.title if plex_track else None,
                     "plex_artist": plex_track.grandparentTitle if plex_track else None
                 })
+            plex.match_cache.flush()
         except HTTPException:
             # Plex not connected - return tracks without matching
-            for sp_track in playlist.tracks:
+            for sp_track in sp_tracks:
                 tracks_info.append({
                     "title": sp_track.title,
                     "artist": sp_track.artist,
@@ -557,24 +676,27 @@ def preview_spotify_playlist(request: SpotifyUrlRequest):
                     "plex_artist": None
                 })
         
+        playlist = info['playlist']
         return {
             "name": playlist.name,
             "description": playlist.description,
             "owner": playlist.owner,
             "url": playlist.url,
             "image_url": playlist.image_url,
-            "track_count": len(playlist.tracks),
+            "track_count": len(tracks_info),
             "tracks": tracks_info
         }
         
     except ValueError as e:
         raise HTTPException(status_code=400, detail=str(e))
+    except CircuitOpenError:
+        raise
     except Exception as e:
         logger.exception("Error fetching Spotify playlist")
         raise HTTPException(status_code=500, detail=f"Error fetching playlist: {str(e)}")
 
 
-@app.post("/api/spotify/import")
+@app.post("/api/spotify/import", dependencies=[Depends(admission.heavy)])
 def import_spotify_playlist(
     request: SpotifyImportRequest,
     plex: PlexService = Depends(get_plex_service),
@@ -591,16 +713,7 @@ def import_spotify_playlist(
         sp_playlist = spotify.get_playlist(request.url)
         
         # Convert to Playlist format for import
-        tracks = []
-        for sp_track in sp_playlist.tracks:
-            track = Track(
-                filename=f"{sp_track.artist} - {sp_track.title}",
-                path=f"spotify:{sp_track.uri or ''}",
-                title=sp_track.title,
-                artist=sp_track.artist,
-                duration=sp_track.duration_ms // 1000 if sp_track.duration_ms else None
-            )
-            tracks.append(track)
+        tracks = TrackColumns(sp_track.to_track() for sp_track in sp_playlist.tracks)
         
         playlist = Playlist(
             name=sp_playlist.name,
@@ -636,13 +749,51 @@ def import_spotify_playlist(
         
     except ValueError as e:
         raise HTTPException(status_code=400, detail=str(e))
-    except HTTPException:
+    except (HTTPException, CircuitOpenError):
         raise
     except Exception as e:
         logger.exception("Spotify import failed")
         raise HTTPException(status_code=500, detail=f"Import failed: {str(e)}")
 
 
+@app.post("/api/spotify/import-bulk")
+def import_spotify_bulk(
+    request: SpotifyBulkImportRequest,
+    background_tasks: BackgroundTasks,
+    plex: PlexService = Depends(get_plex_service),
+):
+    """Import many Spotify playlists in one background job (poll /api/jobs/{job_id})"""
+    if not is_spotify_available():
+        raise HTTPException(status_code=503, detail="Spotify functionality not available")
+    
+    if not is_spotify_configured():
+        raise HTTPException(status_code=400, detail="Spotify credentials not configured")
+    
+    urls = list(dict.fromkeys(u.strip() for u in request.urls if u.strip()))
+    invalid = [u for u in urls if not SpotifyService.is_valid_url(u)]
+    if not urls or invalid:
+        raise HTTPException(status_code=400, detail=f"Invalid Spotify URLs: {', '.join(invalid)}" if invalid else "No URLs given")
+    
+    spotify = get_spotify_service()
+    job = jobs.create_job("spotify_bulk_import", total=len(urls))
+    # Queued behind other heavy work instead of taking a pool thread right away
+    background_tasks.add_task(
+        admission.run_admitted, "heavy", run_spotify_bulk_import, job.id, urls, request.overwrite, spotify, plex
+    )
+    return jobs.get_job(job.id)
+
+
+# ============ Jobs ============
+
+@app.get("/api/jobs/{job_id}")
+def get_job_status(job_id: str):
+    """Progress and per-item results of a background job"""
+    job = jobs.get_job(job_id)
+    if not job:
+        raise HTTPException(status_code=404, detail="Job not found")
+    return job
+
+
 # ============ SLSKD endpoints ============
 
 from .slskd_service import (
@@ -658,16 +809,52 @@ class SlskdSettingsRequest(BaseModel):
     search_timeout: int = 10
     max_results: int = 50
     download_attempts: int = 3
+    max_concurrent_searches: int = 5
+    good_enough_count: int = 3
+    good_enough_extensions: List[str] = ["flac"]
+    good_enough_min_bitrate: int = 0
+    max_peer_queue_length: int = 100
+    min_peer_upload_speed: int = 0
+    require_free_slot: bool = False
+    min_file_size: int = 100_000
+    plex_download_path: str = ""  # slskd's downloads folder as seen by Plex (enables partial scans)
 
 
 class SlskdSearchRequest(BaseModel):
     query: str
     artist: Optional[str] = None
     title: Optional[str] = None
+    early_return: bool = True
+
+
+class SlskdBatchSearchRequest(BaseModel):
+    queries: List[str]
+    timeout: Optional[int] = None
+
+
+class AcquireTrack(BaseModel):
+    artist: Optional[str] = None
+    title: Optional[str] = None
+    duration: Optional[int] = None  # seconds
+    filename: str = ""
+    
+    def to_track(self) -> Track:
+        return Track(filename=self.filename, path=self.filename, title=self.title,
+                     artist=self.artist, duration=self.duration)
 
 
 class SlskdQueueRequest(BaseModel):
     files: List[dict]
+    track: Optional[AcquireTrack] = None  # with playlist_name: add the download to that playlist once Plex has it
+    playlist_name: Optional[str] = None
+
+
+class SlskdAcquireRequest(BaseModel):
+    playlist_path: Optional[str] = None  # M3U playlist: its tracks missing from Plex are acquired
+    tracks: List[AcquireTrack] = []      # or explicit unmatched tracks from a preview
+    playlist_name: Optional[str] = None  # playlist to add downloads to (defaults to the M3U playlist's name)
+    dry_run: bool = False
+    max_in_flight: Optional[int] = None
 
 
 @app.get("/api/slskd/status")
@@ -696,25 +883,42 @@ def get_slskd_settings():
         "allowed_extensions": settings.get('slskd_allowed_extensions', ['flac', 'mp3', 'wav', 'ogg', 'm4a']),
         "search_timeout": settings.get('slskd_search_timeout', 10),
         "max_results": settings.get('slskd_max_results', 50),
-        "download_attempts": settings.get('slskd_download_attempts', 3)
+        "download_attempts": settings.get('slskd_download_attempts', 3),
+        "max_concurrent_searches": settings.get('slskd_max_concurrent_searches', 5),
+        "good_enough_count": settings.get('slskd_good_enough_count', 3),
+        "good_enough_extensions": settings.get('slskd_good_enough_extensions', ['flac']),
+        "good_enough_min_bitrate": settings.get('slskd_good_enough_min_bitrate', 0),
+        "max_peer_queue_length": settings.get('slskd_max_peer_queue_length', 100),
+        "min_peer_upload_speed": settings.get('slskd_min_peer_upload_speed', 0),
+        "require_free_slot": settings.get('slskd_require_free_slot', False),
+        "min_file_size": settings.get('slskd_min_file_size', 100_000),
+        "plex_download_path": settings.get('slskd_plex_download_path', '')
     }
 
 
 @app.post("/api/slskd/settings")
 def save_slskd_settings(request: SlskdSettingsRequest):
     """Save SLSKD settings"""
-    settings = load_settings()
-    settings['slskd_enabled'] = request.enabled
-    settings['slskd_url'] = request.url
-    settings['slskd_allowed_extensions'] = request.allowed_extensions
-    settings['slskd_search_timeout'] = request.search_timeout
-    settings['slskd_max_results'] = request.max_results
-    settings['slskd_download_attempts'] = request.download_attempts
-    save_settings(settings)
+    with edit_settings() as settings:
+        settings['slskd_enabled'] = request.enabled
+        settings['slskd_url'] = request.url
+        settings['slskd_allowed_extensions'] = request.allowed_extensions
+        settings['slskd_search_timeout'] = request.search_timeout
+        settings['slskd_max_results'] = request.max_results
+        settings['slskd_download_attempts'] = request.download_attempts
+        settings['slskd_max_concurrent_searches'] = request.max_concurrent_searches
+        settings['slskd_good_enough_count'] = request.good_enough_count
+        settings['slskd_good_enough_extensions'] = request.good_enough_extensions
+        settings['slskd_good_enough_min_bitrate'] = request.good_enough_min_bitrate
+        settings['slskd_max_peer_queue_length'] = request.max_peer_queue_length
+        settings['slskd_min_peer_upload_speed'] = request.min_peer_upload_speed
+        settings['slskd_require_free_slot'] = request.require_free_slot
+        settings['slskd_min_file_size'] = request.min_file_size
+        settings['slskd_plex_download_path'] = request.plex_download_path
     return {"status": "ok", "message": "SLSKD settings saved"}
 
 
-@app.post("/api/slskd/test")
+@app.post("/api/slskd/test", dependencies=[Depends(admission.external)])
 def test_slskd_connection(data: dict):
     """Test connection to SLSKD server"""
     if not is_slskd_configured():
@@ -734,7 +938,31 @@ def test_slskd_connection(data: dict):
         raise HTTPException(status_code=400, detail=message)
 
 
-@app.post("/api/slskd/search")
+def _search_result_info(result, query: str) -> dict:
+    return {
+        "search_id": result.search_id,
+        "query": query,
+        "file_count": result.file_count,
+        "files": [
+            {
+                "username": f.username,
+                "filename": f.filename,
+                "size": f.size,
+                "extension": f.extension,
+                "bit_rate": f.bit_rate,
+                "bit_depth": f.bit_depth,
+                "length": f.length,
+                "has_free_slot": f.has_free_slot,
+                "queue_length": f.queue_length,
+                "upload_speed": f.upload_speed,
+                "eta_seconds": round(f.eta_seconds())
+            }
+            for f in result.files[:50]  # Limit to 50 results
+        ]
+    }
+
+
+@app.post("/api/slskd/search", dependencies=[Depends(admission.external)])
 def slskd_search(request: SlskdSearchRequest):
     """Search for tracks on Soulseek"""
     if not is_slskd_configured():
@@ -751,32 +979,96 @@ def slskd_search(request: SlskdSearchRequest):
         query = request.query
     
     try:
-        result = service.search(query)
-        return {
-            "search_id": result.search_id,
-            "query": query,
-            "file_count": result.file_count,
-            "files": [
-                {
-                    "username": f.username,
-                    "filename": f.filename,
-                    "size": f.size,
-                    "extension": f.extension,
-                    "bit_rate": f.bit_rate,
-                    "bit_depth": f.bit_depth,
-                    "length": f.length
-                }
-                for f in result.files[:50]  # Limit to 50 results
-            ]
-        }
+        result = service.search(query, early_return=request.early_return)
+        return _search_result_info(result, query)
     except TimeoutError as e:
         raise HTTPException(status_code=408, detail=str(e))
+    except CircuitOpenError:
+        raise
     except Exception as e:
         logger.exception("SLSKD search failed")
         raise HTTPException(status_code=500, detail=f"Search failed: {str(e)}")
 
 
-@app.post("/api/slskd/queue")
+@app.post("/api/slskd/search-batch")
+def slskd_search_batch(request: SlskdBatchSearchRequest, slot: admission.Slot = Depends(admission.external)):
+    """Search for many tracks concurrently; NDJSON, one line per query as its search finishes"""
+    if not is_slskd_configured():
+        raise HTTPException(status_code=400, detail="SLSKD API key not configured")
+    
+    service = get_slskd_service()
+    if not service:
+        raise HTTPException(status_code=500, detail="Failed to initialize SLSKD service")
+    
+    def generate():
+        for query, outcome in service.search_many(request.queries, timeout=request.timeout):
+            if isinstance(outcome, Exception):
+                line = {"query": query, "file_count": 0, "files": [], "error": str(outcome)}
+            else:
+                line = _search_result_info(outcome, query)
+            yield json.dumps(line) + "\n"
+    
+    return StreamingResponse(slot.stream(generate()), media_type="application/x-ndjson",
+                             background=slot.hold())
+
+
+@app.get("/api/slskd/downloads")
+def slskd_tracked_downloads():
+    """Queued downloads followed up by the tracker (scan, re-match, add to playlist)"""
+    return download_tracker.status()
+
+
+@app.post("/api/slskd/queue-batch", dependencies=[Depends(admission.external)])
+def slskd_queue_batch(request: SlskdQueueRequest):
+    """Queue many files at once (one request per peer); returns a result per file"""
+    if not is_slskd_configured():
+        raise HTTPException(status_code=400, detail="SLSKD API key not configured")
+    
+    service = get_slskd_service()
+    if not service:
+        raise HTTPException(status_code=500, detail="Failed to initialize SLSKD service")
+    
+    results = service.queue_many(request.files)
+    return {
+        "queued": sum(1 for r in results if r["success"]),
+        "failed": sum(1 for r in results if not r["success"]),
+        "results": results
+    }
+
+
+@app.post("/api/slskd/acquire")
+def slskd_acquire(request: SlskdAcquireRequest, background_tasks: BackgroundTasks):
+    """Search and queue downloads for tracks missing from Plex in one background job (poll /api/jobs/{job_id})"""
+    if not is_slskd_configured():
+        raise HTTPException(status_code=400, detail="SLSKD API key not configured")
+    
+    service = get_slskd_service()
+    if not service:
+        raise HTTPException(status_code=500, detail="Failed to initialize SLSKD service")
+    
+    tracks = [t.to_track() for t in request.tracks]
+    plex = None
+    playlist_name = request.playlist_name
+    if request.playlist_path:
+        if not os.path.exists(request.playlist_path):
+            raise HTTPException(status_code=404, detail="Playlist file not found")
+        plex = get_plex_service()
+        playlist = _open_playlist(request.playlist_path)
+        tracks.extend(playlist.tracks)
+        playlist_name = playlist_name or playlist.name
+    if not tracks:
+        raise HTTPException(status_code=400, detail="No tracks given")
+    
+    job = jobs.create_job("slskd_acquire")
+    background_tasks.add_task(
+        admission.run_admitted, "heavy", run_acquisition, job.id, tracks, service,
+        dry_run=request.dry_run, max_in_flight=request.max_in_flight, plex=plex,
+        playlist_name=playlist_name
+    )
+    return jobs.get_job(job.id)
+
+
+@app.post("/api/slskd/queue", dependencies=[Depends(admission.external)])
 def slskd_queue_download(request: SlskdQueueRequest):
     """Queue files for download"""
     if not is_slskd_configured():
@@ -789,9 +1081,14 @@ def slskd_queue_download(request: SlskdQueueRequest):
     try:
         result = service.queue_download(request.files)
         if result['success']:
+            if request.track:
+                download_tracker.watch(result['file'].get('username', ''), result['file'].get('filename', ''),
+                                       request.track.to_track(), request.playlist_name)
             return result
         else:
             raise HTTPException(status_code=400, detail=result['message'])
+    except (HTTPException, CircuitOpenError):
+        raise
     except Exception as e:
         logger.exception("SLSKD queue failed")
         raise HTTPException(status_code=500, detail=f"Queue failed: {str(e)}")
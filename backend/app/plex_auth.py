@@ -13,6 +13,8 @@ from typing import Optional, Tuple
 from dataclasses import dataclass
 import uuid
 
+from .http_client import get_session, request_with_retry
+
 # Plex API endpoints
 PLEX_PINS_URL = "https://plex.tv/api/v2/pins"
 PLEX_AUTH_URL = "https://app.plex.tv/auth"
@@ -69,13 +71,14 @@ def request_pin(client_id: str) -> Tuple[Optional[PlexPin], Optional[str]]:
     Returns (PlexPin, None) on success or (None, error_message) on failure.
     """
     try:
-        response = requests.post(
+        response = request_with_retry(
+            get_session("plex.tv"),
+            "POST",
             PLEX_PINS_URL,
             headers=get_headers(client_id),
             data={"strong": "true"},
             timeout=10
         )
-        response.raise_for_status()
         data = response.json()
         
         # Build the auth URL
@@ -106,12 +109,13 @@ def check_pin(pin_id: int, client_id: str) -> Tuple[Optional[str], Optional[str]
     Returns (token, None) if authorized, (None, None) if pending, (None, error) on failure.
     """
     try:
-        response = requests.get(
+        response = request_with_retry(
+            get_session("plex.tv"),
+            "GET",
             f"{PLEX_PINS_URL}/{pin_id}",
             headers=get_headers(client_id),
             timeout=10
         )
-        response.raise_for_status()
         data = response.json()
         
         auth_token = data.get("authToken")
@@ -152,12 +156,13 @@ def get_user_info(token: str, client_id: str) -> Tuple[Optional[PlexUser], Optio
     Returns (PlexUser, None) on success or (None, error_message) on failure.
     """
     try:
-        response = requests.get(
+        response = request_with_retry(
+            get_session("plex.tv"),
+            "GET",
             PLEX_USER_URL,
             headers=get_headers(client_id, token),
             timeout=10
         )
-        response.raise_for_status()
         data = response.json()
         
         return PlexUser(
@@ -178,32 +183,39 @@ def get_servers(token: str, client_id: str) -> Tuple[list, Optional[str]]:
     Returns (servers_list, None) on success or ([], error_message) on failure.
     """
     try:
-        response = requests.get(
+        response = request_with_retry(
+            get_session("plex.tv"),
+            "GET",
             "https://plex.tv/api/v2/resources",
             headers=get_headers(client_id, token),
-            params={"includeHttps": 1, "includeRelay": 0},
+            params={"includeHttps": 1, "includeRelay": 1},
             timeout=10
         )
-        response.raise_for_status()
         data = response.json()
         
         servers = []
         for resource in data:
             if resource.get("provides") == "server":
-                # Get the best connection (prefer local)
-                connections = resource.get("connections", [])
-                local_conn = next((c for c in connections if c.get("local")), None)
-                remote_conn = next((c for c in connections if not c.get("local")), None)
+                # All connections, LAN first and relays last; the fastest
+                # reachable one is picked when connecting (plex_connection)
+                connections = sorted(
+                    (
+                        {"uri": c.get("uri", ""), "local": bool(c.get("local")), "relay": bool(c.get("relay"))}
+                        for c in resource.get("connections", []) if c.get("uri")
+                    ),
+                    key=lambda c: (c["relay"], not c["local"])
+                )
                 
-                best_conn = local_conn or remote_conn
+                best_conn = connections[0] if connections else None
                 if best_conn:
                     servers.append({
                         "name": resource.get("name", "Unknown"),
                         "clientIdentifier": resource.get("clientIdentifier", ""),
                         "owned": resource.get("owned", False),
-                        "url": best_conn.get("uri", ""),
-                        "local": best_conn.get("local", False),
+                        "url": best_conn["uri"],
+                        "local": best_conn["local"],
                         "accessToken": resource.get("accessToken", token),
+                        "connections": connections,
                     })
         
         return servers, None
@@ -0,0 +1,94 @@
+"""
+Plex connection racing
+A server is usually reachable at several URIs (LAN address, public address,
+relay). All of them are probed concurrently and the fastest reachable one is
+used, local connections first. The choice is cached until a connection error
+invalidates it.
+"""
+import time
+import logging
+import threading
+from concurrent.futures import ThreadPoolExecutor, as_completed, TimeoutError as FuturesTimeout
+from typing import Dict, List, Optional, Tuple
+
+from .http_client import get_session
+
+logger = logging.getLogger(__name__)
+
+# Probes that take longer than this don't take part (seconds)
+RACE_TIMEOUT = 5.0
+
+_chosen: Dict[Tuple[str, ...], str] = {}
+_lock = threading.Lock()
+
+
+def _tier(connection: dict) -> int:
+    """Preference order: LAN, then direct remote, then relay"""
+    if connection.get("relay"):
+        return 2
+    return 0 if connection.get("local") else 1
+
+
+def _probe(uri: str, token: str, timeout: float) -> float:
+    """Latency of /identity in seconds; raises when unreachable"""
+    started = time.time()
+    response = get_session("plex", verify=False).get(
+        f"{uri.rstrip('/')}/identity",
+        headers={"X-Plex-Token": token, "Accept": "application/json"},
+        timeout=timeout
+    )
+    response.raise_for_status()
+    return time.time() - started
+
+
+def race(connections: List[dict], token: str, timeout: float = RACE_TIMEOUT) -> Optional[str]:
+    """URI of the best reachable connection, or None if none answered"""
+    if not connections:
+        return None
+    pool = ThreadPoolExecutor(max_workers=len(connections))
+    futures = {pool.submit(_probe, c["uri"], token, timeout): c for c in connections}
+    reachable = []
+    try:
+        for future in as_completed(futures, timeout=timeout):
+            connection = futures[future]
+            try:
+                latency = future.result()
+            except Exception as e:
+                logger.debug(f"Plex connection {connection['uri']} unreachable: {e}")
+                continue
+            # Results arrive fastest first, so the first LAN answer can't be beaten
+            if _tier(connection) == 0:
+                return connection["uri"]
+            reachable.append((_tier(connection), latency, connection["uri"]))
+    except FuturesTimeout:
+        pass
+    finally:
+        pool.shutdown(wait=False, cancel_futures=True)
+    return min(reachable)[2] if reachable else None
+
+
+def best_url(plex_url: str, connections: List[dict], token: str) -> str:
+    """The URL to use for the server plex_url belongs to.
+    connections are all URIs of that server (from plex.tv); without them,
+    or if none is reachable, plex_url is used as is."""
+    if len(connections) < 2 or not any(c.get("uri") == plex_url for c in connections):
+        return plex_url
+
+    key = tuple(sorted(c["uri"] for c in connections))
+    with _lock:
+        if key in _chosen:
+            return _chosen[key]
+
+    uri = race(connections, token)
+    if not uri:
+        return plex_url
+    logger.info(f"Using Plex connection {uri}")
+    with _lock:
+        _chosen[key] = uri
+    return uri
+
+
+def invalidate():
+    """Forget chosen connections so the next best_url() races again"""
+    with _lock:
+        _chosen.clear()
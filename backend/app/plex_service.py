@@ -1,7 +1,8 @@
 from plexapi.server import PlexServer
 from plexapi.exceptions import NotFound, Unauthorized
-from typing import List, Optional, Tuple
+from typing import Iterable, Iterator, List, Optional, Tuple
 from dataclasses import dataclass
+from concurrent.futures import ThreadPoolExecutor
 import os
 import re
 import requests
@@ -12,17 +13,57 @@ requests.packages.urllib3.disable_warnings(
     requests.packages.urllib3.exceptions.InsecureRequestWarning
 )
 
-from .m3u_parser import Playlist, Track
+from .m3u_parser import Playlist, Track, summarize_m3u
+from .library_index import LibrarySnapshot, LibraryTrack, MatchCache, library_store, track_identifiers
+from .health import registry as health_registry
+from .http_client import get_session
+from . import plex_connection
 
 logger = __import__("logging").getLogger(__name__)
 
 
+def normalize_string(s: str) -> str:
+    """Normalize string for matching"""
+    if not s:
+        return ""
+    # Remove special chars, lowercase
+    s = re.sub(r'[^\w\s]', '', s.lower())
+    # Remove extra spaces
+    s = ' '.join(s.split())
+    return s
+
+
+# Preference between match types when several sections match (lower is better)
+_MATCH_QUALITY = {"id": 0, "exact": 0, "title": 1, "fuzzy": 2}
+
+# Threads for searching several sections at once, shared by every PlexService
+# (one is created per settings change) so threads don't pile up across them
+_search_pool = ThreadPoolExecutor(
+    max_workers=int(os.environ.get('PLEX_SEARCH_WORKERS', '16')), thread_name_prefix="plex-search"
+)
+
+
+def _under(path: str, folder: str) -> bool:
+    folder = folder.rstrip('/')
+    return path == folder or path.startswith(folder + '/')
+
+
+def _known_length(playlist: Playlist) -> int:
+    """Track count without consuming a lazy track iterator (counts the m3u's entries instead)"""
+    if hasattr(playlist.tracks, '__len__'):
+        return len(playlist.tracks)
+    try:
+        return summarize_m3u(playlist.path).track_count
+    except OSError:
+        return 0
+
+
 @dataclass
 class MatchResult:
     track: Track
     plex_track: Optional[any] = None
     matched: bool = False
-    match_type: str = "none"  # exact, fuzzy, none
+    match_type: str = "none"  # id, exact, fuzzy, title, none
 
 
 @dataclass
@@ -36,24 +77,22 @@ class ImportResult:
 
 
 class PlexService:
-    def __init__(self, url: str, token: str, library_name: str = "Music"):
+    def __init__(self, url: str, token: str, library_name: str = "Music", library_names: Optional[List[str]] = None):
         self.url = url
         self.token = token
         self.library_name = library_name
+        # Sections matched against, highest priority first
+        self.library_names = list(library_names or [library_name])
         self._server = None
-        self._library = None
+        self._sections: Optional[list] = None
+        self._match_cache: Optional[MatchCache] = None
     
     def connect(self) -> Tuple[bool, str]:
         """Connect to Plex server"""
         try:
-            session = requests.Session()
-            session.verify = False
-            # Ensure session is used for all requests (no default verify)
-            adapter = requests.adapters.HTTPAdapter()
-            session.mount("https://", adapter)
-            session.mount("http://", adapter)
+            # Shared pooled session, verify disabled for self-signed server certs
             self._server = PlexServer(
-                self.url, self.token, timeout=30, session=session
+                self.url, self.token, timeout=30, session=get_session("plex", verify=False)
             )
             return True, f"Connected to {self._server.friendlyName}"
         except Unauthorized:
@@ -63,17 +102,71 @@ class PlexService:
             return False, f"Connection failed: {str(e)}"
     
     def get_library(self):
-        """Get music library"""
+        """Get music library (the highest-priority section)"""
+        return self.get_sections()[0]
+    
+    def get_sections(self) -> list:
+        """Music sections to match against, in priority order; missing ones are skipped"""
         if not self._server:
             raise Exception("Not connected to Plex")
         
-        if self._library is None:
-            try:
-                self._library = self._server.library.section(self.library_name)
-            except NotFound:
-                raise Exception(f"Library '{self.library_name}' not found")
+        if self._sections is None:
+            sections = []
+            for name in self.library_names:
+                try:
+                    sections.append(self._server.library.section(name))
+                except NotFound:
+                    logger.warning("Library %r not found, not matching against it", name)
+            if not sections:
+                raise Exception(f"Library '{', '.join(self.library_names)}' not found")
+            self._sections = sections
         
-        return self._library
+        return self._sections
+    
+    def _library_key(self) -> str:
+        """Identifies this server's set of music sections in the shared store"""
+        if not self._server:
+            raise Exception("Not connected to Plex")
+        return f"{self._server.machineIdentifier}/{'|'.join(self.library_names)}"
+    
+    @property
+    def match_cache(self) -> MatchCache:
+        if self._match_cache is None:
+            self._match_cache = MatchCache(library_store())
+        return self._match_cache
+    
+    @property
+    def snapshot(self) -> Optional[LibrarySnapshot]:
+        """Current snapshot (possibly built by another worker), None if never built"""
+        if not self._server:
+            return None
+        return LibrarySnapshot.load(library_store(), self._library_key())
+    
+    def build_snapshot(self) -> LibrarySnapshot:
+        """Snapshot the whole music library (enables exact identifier matches)"""
+        snapshot = LibrarySnapshot.build(library_store(), self._library_key(), self.get_sections())
+        # The library changed since those matches were found
+        self.match_cache.clear(self._library_key())
+        return snapshot
+    
+    def _resolve_items(self, items: list) -> list:
+        """Replace snapshot LibraryTrack records with real Plex items, keeping order"""
+        keys = [item.ratingKey for item in items if isinstance(item, LibraryTrack)]
+        if not keys:
+            return items
+        
+        fetched = {}
+        for i in range(0, len(keys), 200):
+            for plex_item in self._server.fetchItems(keys[i:i + 200]):
+                fetched[int(plex_item.ratingKey)] = plex_item
+        
+        resolved = []
+        for item in items:
+            if isinstance(item, LibraryTrack):
+                item = fetched.get(item.ratingKey)
+            if item is not None:
+                resolved.append(item)
+        return resolved
     
     def get_libraries(self) -> List[dict]:
         """Get all music libraries"""
@@ -98,13 +191,7 @@ class PlexService:
     
     def _normalize_string(self, s: str) -> str:
         """Normalize string for matching"""
-        if not s:
-            return ""
-        # Remove special chars, lowercase
-        s = re.sub(r'[^\w\s]', '', s.lower())
-        # Remove extra spaces
-        s = ' '.join(s.split())
-        return s
+        return normalize_string(s)
     
     def _similarity(self, a: str, b: str) -> float:
         """Calculate string similarity"""
@@ -134,12 +221,62 @@ class PlexService:
     
     def find_track(self, track: Track) -> MatchResult:
         """Find a track in Plex library using search"""
-        library = self.get_library()
+        # Exact identifier match (MusicBrainz ID / ISRC) skips search and scoring
+        identifiers = track_identifiers(track)
+        snapshot = self.snapshot if identifiers else None
+        if snapshot:
+            hit = snapshot.lookup(identifiers)
+            if hit:
+                return MatchResult(track=track, plex_track=hit, matched=True, match_type="id")
+        
         title, artist = self._extract_search_terms(track)
         
         if not title:
             return MatchResult(track=track, matched=False)
         
+        # Matches found by any worker are reused instead of searching Plex again
+        library_key = self._library_key()
+        cache_key = f"{normalize_string(artist)}\x1f{normalize_string(title)}"
+        cached = self.match_cache.get(library_key, cache_key)
+        if cached:
+            plex_track, match_type = cached
+            return MatchResult(track=track, plex_track=plex_track, matched=True, match_type=match_type)
+        
+        result = self._search_track(track, title, artist)
+        if result.matched:
+            self.match_cache.put(library_key, cache_key, result.plex_track, result.match_type)
+        return result
+    
+    def _search_track(self, track: Track, title: str, artist: str) -> MatchResult:
+        """Search all sections at once; the best match type wins, ties go to the
+        higher-priority section"""
+        sections = self.get_sections()
+        if len(sections) == 1:
+            return self._search_section(sections[0], track, title, artist)
+        
+        futures = [
+            _search_pool.submit(self._search_section, section, track, title, artist)
+            for section in sections
+        ]
+        best = None
+        try:
+            for future in futures:
+                result = future.result()
+                if result.matched and (
+                    best is None or _MATCH_QUALITY[result.match_type] < _MATCH_QUALITY[best.match_type]
+                ):
+                    best = result
+                if best and _MATCH_QUALITY[best.match_type] == 0:
+                    # Lower-priority sections can't beat an exact match
+                    break
+        finally:
+            # Drop searches that haven't started yet; running ones finish on their own
+            for future in futures:
+                future.cancel()
+        return best or MatchResult(track=track, matched=False)
+    
+    def _search_section(self, library, track: Track, title: str, artist: str) -> MatchResult:
+        """Match by searching one section and scoring title/artist similarity"""
         # Strategy 1: Search by title
         try:
             # Search tracks by title
@@ -216,20 +353,70 @@ class PlexService:
         
         return MatchResult(track=track, matched=False)
     
+    def create_playlist(self, name: str, plex_tracks: list, overwrite: bool = False) -> Optional[str]:
+        """Create (or replace) a playlist from already matched items; returns an error or None"""
+        if not self._server:
+            return "Not connected to Plex"
+        # Checked first, so overwriting never leaves the user with no playlist at all
+        if not plex_tracks:
+            return "No matching tracks found in Plex library"
+        
+        try:
+            existing = next((p for p in self._server.playlists() if p.title == name), None)
+            if existing and not overwrite:
+                return f"Playlist '{name}' already exists"
+            self._server.createPlaylist(name, items=self._resolve_items(plex_tracks))
+            # Old copy goes only once the new one exists
+            if existing:
+                existing.delete()
+        except Exception as e:
+            return str(e)
+        return None
+    
+    def add_to_playlist(self, name: str, plex_tracks: list) -> Optional[str]:
+        """Append matched items to a playlist, creating it if missing; returns an error or None"""
+        if not self._server:
+            return "Not connected to Plex"
+        
+        try:
+            existing = next((p for p in self._server.playlists() if p.title == name), None)
+            if not existing:
+                return self.create_playlist(name, plex_tracks)
+            existing.addItems(self._resolve_items(plex_tracks))
+        except Exception as e:
+            return str(e)
+        return None
+    
+    def scan_folder(self, path: str):
+        """Partial library scan of one folder (seconds instead of a full section scan),
+        in the section whose locations contain it"""
+        section = next(
+            (s for s in self.get_sections() if any(_under(path, loc) for loc in s.locations)),
+            self.get_library()
+        )
+        section.update(path=path)
+    
+    def iter_matches(self, tracks: Iterable[Track]) -> Iterator[MatchResult]:
+        """Match tracks as they arrive (works with lazy iter_m3u streams)"""
+        try:
+            for track in tracks:
+                yield self.find_track(track)
+        finally:
+            self.match_cache.flush()
+    
     def preview_import(self, playlist: Playlist) -> ImportResult:
         """Preview what tracks would be matched"""
         matches = []
         matched_count = 0
         
-        for track in playlist.tracks:
-            result = self.find_track(track)
+        for result in self.iter_matches(playlist.tracks):
             matches.append(result)
             if result.matched:
                 matched_count += 1
         
         return ImportResult(
             playlist_name=playlist.name,
-            total_tracks=len(playlist.tracks),
+            total_tracks=len(matches),
             matched_tracks=matched_count,
             created=False,
             matches=matches
@@ -240,7 +427,7 @@ class PlexService:
         if not self._server:
             return ImportResult(
                 playlist_name=playlist.name,
-                total_tracks=len(playlist.tracks),
+                total_tracks=_known_length(playlist),
                 matched_tracks=0,
                 created=False,
                 error="Not connected to Plex"
@@ -258,7 +445,7 @@ class PlexService:
             else:
                 return ImportResult(
                     playlist_name=playlist.name,
-                    total_tracks=len(playlist.tracks),
+                    total_tracks=_known_length(playlist),
                     matched_tracks=0,
                     created=False,
                     error=f"Playlist '{playlist.name}' already exists"
@@ -268,8 +455,7 @@ class PlexService:
         plex_tracks = []
         matches = []
         
-        for track in playlist.tracks:
-            result = self.find_track(track)
+        for result in self.iter_matches(playlist.tracks):
             matches.append(result)
             if result.matched and result.plex_track:
                 plex_tracks.append(result.plex_track)
@@ -277,7 +463,7 @@ class PlexService:
         if not plex_tracks:
             return ImportResult(
                 playlist_name=playlist.name,
-                total_tracks=len(playlist.tracks),
+                total_tracks=len(matches),
                 matched_tracks=0,
                 created=False,
                 error="No matching tracks found in Plex library",
@@ -286,10 +472,11 @@ class PlexService:
         
         # Create playlist
         try:
+            plex_tracks = self._resolve_items(plex_tracks)
             self._server.createPlaylist(playlist.name, items=plex_tracks)
             return ImportResult(
                 playlist_name=playlist.name,
-                total_tracks=len(playlist.tracks),
+                total_tracks=len(matches),
                 matched_tracks=len(plex_tracks),
                 created=True,
                 matches=matches
@@ -297,9 +484,33 @@ class PlexService:
         except Exception as e:
             return ImportResult(
                 playlist_name=playlist.name,
-                total_tracks=len(playlist.tracks),
+                total_tracks=len(matches),
                 matched_tracks=len(plex_tracks),
                 created=False,
                 error=str(e),
                 matches=matches
             )
+
+
+def _probe_plex() -> Optional[bool]:
+    from .config import get_settings
+    settings = get_settings()
+    if not settings.plex_token:
+        return None
+    url = plex_connection.best_url(settings.plex_url, settings.plex_connections, settings.plex_token)
+    try:
+        response = get_session("plex", verify=False).get(
+            f"{url.rstrip('/')}/identity",
+            headers={"X-Plex-Token": settings.plex_token, "Accept": "application/json"},
+            timeout=5
+        )
+    except requests.exceptions.RequestException:
+        # The chosen connection went away: race again on the next connect
+        plex_connection.invalidate()
+        raise
+    # The server answered: a 401/403 is a token problem for get_plex_service to
+    # report, not an outage, so only 5xx counts against the circuit
+    return response.status_code < 500
+
+
+health_registry.register("plex", _probe_plex)
@@ -0,0 +1,140 @@
+"""
+Shared state store - SQLite database shared by all worker processes
+With several uvicorn workers every process has its own module globals, so
+state a request may need in another worker (jobs, pending Plex logins,
+tracked downloads, the library snapshot and match cache) lives here instead.
+The database runs in WAL mode: readers never block each other or the writer,
+and its pages are shared between workers through the OS page cache.
+"""
+import os
+import json
+import time
+import sqlite3
+import logging
+import threading
+from contextlib import contextmanager
+from typing import Any, Callable, Iterator, List, Optional
+
+from .config import CONFIG_DIR
+
+logger = logging.getLogger(__name__)
+
+STATE_DB_FILE = os.path.join(CONFIG_DIR, "state.db")
+
+# Seconds a worker waits for another worker's write to finish
+BUSY_TIMEOUT = 30.0
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS kv (
+    namespace TEXT NOT NULL,
+    key TEXT NOT NULL,
+    value TEXT NOT NULL,
+    expires_at REAL,
+    PRIMARY KEY (namespace, key)
+);
+CREATE INDEX IF NOT EXISTS kv_expires ON kv (expires_at);
+"""
+
+
+class SharedStore:
+    """JSON values by (namespace, key) with optional expiry, plus raw
+    connections/transactions for modules that keep their own tables"""
+
+    def __init__(self, db_path: str = STATE_DB_FILE):
+        self.db_path = db_path
+        os.makedirs(os.path.dirname(db_path), exist_ok=True)
+        # One connection per thread; SQLite handles locking between processes
+        self._local = threading.local()
+        self.executescript(_SCHEMA)
+
+    def connection(self) -> sqlite3.Connection:
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            # Autocommit mode: transactions are opened explicitly in transaction()
+            conn = sqlite3.connect(self.db_path, timeout=BUSY_TIMEOUT, isolation_level=None)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            self._local.conn = conn
+        return conn
+
+    @contextmanager
+    def transaction(self) -> Iterator[sqlite3.Connection]:
+        """Write transaction; takes the write lock up front so read-modify-write is atomic"""
+        conn = self.connection()
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            yield conn
+        except BaseException:
+            conn.execute("ROLLBACK")
+            raise
+        conn.execute("COMMIT")
+
+    def executescript(self, script: str):
+        with self.transaction() as conn:
+            for statement in filter(str.strip, script.split(";")):
+                conn.execute(statement)
+
+    # ---- key/value ----
+
+    def get(self, namespace: str, key: str) -> Optional[Any]:
+        row = self.connection().execute(
+            "SELECT value, expires_at FROM kv WHERE namespace = ? AND key = ?", (namespace, key)
+        ).fetchone()
+        if not row or (row[1] is not None and row[1] < time.time()):
+            return None
+        return json.loads(row[0])
+
+    def values(self, namespace: str) -> List[Any]:
+        rows = self.connection().execute(
+            "SELECT value FROM kv WHERE namespace = ? AND (expires_at IS NULL OR expires_at >= ?)",
+            (namespace, time.time())
+        )
+        return [json.loads(value) for value, in rows]
+
+    def put(self, namespace: str, key: str, value: Any, ttl: Optional[float] = None):
+        """Store a JSON-serializable value; with ttl it expires after that many seconds"""
+        with self.transaction() as conn:
+            self._put(conn, namespace, key, value, ttl)
+
+    def update(self, namespace: str, key: str, change: Callable[[Any], Optional[float]]) -> Optional[Any]:
+        """Atomically modify a stored value in place: change(value) mutates it and
+        returns a new ttl (or None to keep none). Returns the new value, None if missing."""
+        with self.transaction() as conn:
+            row = conn.execute(
+                "SELECT value, expires_at FROM kv WHERE namespace = ? AND key = ?", (namespace, key)
+            ).fetchone()
+            if not row or (row[1] is not None and row[1] < time.time()):
+                return None
+            value = json.loads(row[0])
+            ttl = change(value)
+            self._put(conn, namespace, key, value, ttl)
+            return value
+
+    def delete(self, namespace: str, key: str):
+        with self.transaction() as conn:
+            conn.execute("DELETE FROM kv WHERE namespace = ? AND key = ?", (namespace, key))
+
+    def expire(self):
+        """Drop expired entries (reads already ignore them)"""
+        with self.transaction() as conn:
+            conn.execute("DELETE FROM kv WHERE expires_at < ?", (time.time(),))
+
+    @staticmethod
+    def _put(conn: sqlite3.Connection, namespace: str, key: str, value: Any, ttl: Optional[float]):
+        expires_at = time.time() + ttl if ttl is not None else None
+        conn.execute(
+            "INSERT OR REPLACE INTO kv (namespace, key, value, expires_at) VALUES (?, ?, ?, ?)",
+            (namespace, key, json.dumps(value), expires_at)
+        )
+
+
+_store: Optional[SharedStore] = None
+_store_lock = threading.Lock()
+
+
+def get_store() -> SharedStore:
+    global _store
+    with _store_lock:
+        if _store is None:
+            _store = SharedStore()
+        return _store
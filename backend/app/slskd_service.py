@@ -4,29 +4,48 @@ Allows searching and downloading tracks from Soulseek P2P network
 """
 import os
 import time
+import heapq
 import logging
-from typing import Optional, List, Dict, Any
-from dataclasses import dataclass, field
+import threading
+from collections import deque
+from concurrent.futures import Future
+from typing import Callable, Optional, List, Dict, Any, Iterable, Iterator, Tuple, Union
+from dataclasses import dataclass, field, replace
 import requests
 
+from . import json_stream
+from .health import registry as health_registry
+from .http_client import get_session, request_with_retry, DEFAULT_RETRY_CONFIG
+
 logger = logging.getLogger(__name__)
 
 # Default configurations
-DEFAULT_RETRY_CONFIG = {
-    "max_retries": 3,
-    "initial_delay": 1.0,
-    "max_delay": 10.0,
-    "backoff_multiplier": 2,
-    "retryable_status_codes": [408, 429, 500, 502, 503, 504]
-}
-
 DEFAULT_POLLING_CONFIG = {
     "max_wait_time": 30.0,
     "initial_interval": 0.2,
     "max_interval": 1.0,
-    "backoff_multiplier": 1.3
+    "backoff_multiplier": 1.3,
+    "completion_grace": 5.0  # slack after the search timeout before giving up on a search
+}
+
+# Read size for streamed search responses
+STREAM_CHUNK_SIZE = 64 * 1024
+
+# Completed search results are reused for this long (seconds)
+SEARCH_CACHE_TTL = int(os.environ.get('SLSKD_SEARCH_CACHE_TTL', '600'))
+
+# Expected time-to-complete of a candidate file: wait in the peer's queue plus transfer time.
+# Candidates are ranked by it, with each quality tier below the best counting as extra wait.
+DEFAULT_RANKING_CONFIG = {
+    "queued_transfer_seconds": 60.0,  # assumed wait per transfer ahead in a peer's queue
+    "unknown_upload_speed": 50_000,   # bytes/s assumed when a peer reports no speed
+    "tier_seconds": 120.0,            # wait worth saving by dropping one quality tier
+    "eta_bucket_seconds": 60.0        # files within the same bucket are ordered by tier, then bitrate
 }
 
+# Quality tiers (FLAC > WAV > MP3 > others)
+EXTENSION_PRIORITY = {'flac': 0, 'wav': 1, 'mp3': 2, 'ogg': 3, 'm4a': 4}
+
 # Non-retriable error patterns
 NON_RETRIABLE_PATTERNS = [
     'File not shared',
@@ -48,9 +67,19 @@ class SlskdSettings:
     search_timeout: int = 10  # seconds
     max_results: int = 50
     download_attempts: int = 3
+    max_concurrent_searches: int = 5  # searches in flight at once in batch mode
+    # Early return: stop a running search once this many good files were found (0 = wait for completion)
+    good_enough_count: int = 3
+    good_enough_extensions: List[str] = field(default_factory=lambda: ["flac"])
+    good_enough_min_bitrate: int = 0  # kbps, files without a reported bitrate pass
+    # Peer filters, applied by slskd and again to the responses
+    max_peer_queue_length: int = 100
+    min_peer_upload_speed: int = 0  # bytes/s
+    require_free_slot: bool = False
+    min_file_size: int = 100_000  # bytes, smaller files are skipped while parsing responses
 
 
-@dataclass
+@dataclass(slots=True)
 class SlskdFile:
     """Represents a file from SLSKD search results"""
     username: str
@@ -62,6 +91,34 @@ class SlskdFile:
     bit_depth: Optional[int] = None
     length: Optional[int] = None
     is_locked: bool = False
+    has_free_slot: bool = True
+    queue_length: int = 0
+    upload_speed: int = 0  # bytes/s, 0 = unknown
+    
+    def eta_seconds(self) -> float:
+        """Expected seconds until the file is downloaded from this peer"""
+        return _eta_seconds(self.size, self.has_free_slot, self.queue_length, self.upload_speed)
+
+
+def _eta_seconds(size: int, has_free_slot: bool, queue_length: int, upload_speed: int,
+                 config: dict = DEFAULT_RANKING_CONFIG) -> float:
+    wait = 0.0 if has_free_slot else queue_length * config['queued_transfer_seconds']
+    return wait + (size or 0) / (upload_speed or config['unknown_upload_speed'])
+
+
+def _rank_key(extension: str, is_locked: bool, eta: float, bit_rate: Optional[int],
+              config: dict = DEFAULT_RANKING_CONFIG) -> tuple:
+    """Sort by how soon the file would arrive, a lower quality tier counting as
+    tier_seconds of extra wait each; then by tier and bitrate. A FLAC deep in a
+    peer's queue loses to an MP3 that arrives right away, not to one a minute out."""
+    tier = EXTENSION_PRIORITY.get(extension, 99)
+    cost = eta + tier * config['tier_seconds']
+    return (
+        is_locked,
+        int(cost // config['eta_bucket_seconds']),
+        tier,
+        -(bit_rate or 0)
+    )
 
 
 @dataclass
@@ -74,6 +131,71 @@ class SlskdSearchResult:
     file_count: int
 
 
+class SearchCache:
+    """TTL cache of search results with in-flight coalescing:
+    concurrent identical searches share one network search"""
+    
+    def __init__(self, ttl: float = SEARCH_CACHE_TTL):
+        self.ttl = ttl
+        self._results: Dict[Tuple, Tuple[float, SlskdSearchResult]] = {}
+        self._in_flight: Dict[Tuple, Future] = {}
+        self._lock = threading.Lock()
+    
+    @staticmethod
+    def key(query: str, *variant) -> Tuple:
+        return (' '.join(query.lower().split()),) + variant
+    
+    def get(self, key: Tuple) -> Optional[SlskdSearchResult]:
+        with self._lock:
+            entry = self._results.get(key)
+            if entry and entry[0] > time.time():
+                return _copy_result(entry[1])
+            self._results.pop(key, None)
+            return None
+    
+    def put(self, key: Tuple, result: SlskdSearchResult):
+        with self._lock:
+            now = time.time()
+            for expired in [k for k, (expires, _) in self._results.items() if expires <= now]:
+                del self._results[expired]
+            self._results[key] = (now + self.ttl, _copy_result(result))
+    
+    def get_or_search(self, key: Tuple, search: Callable[[], SlskdSearchResult]) -> SlskdSearchResult:
+        """Cached result, or the result of the search already running for
+        this key, or run search() and cache it. Failures are not cached."""
+        cached = self.get(key)
+        if cached:
+            return cached
+        
+        with self._lock:
+            future = self._in_flight.get(key)
+            owner = future is None
+            if owner:
+                future = self._in_flight[key] = Future()
+        
+        if not owner:
+            return _copy_result(future.result())
+        
+        try:
+            result = search()
+            self.put(key, result)
+            future.set_result(result)
+            return result
+        except BaseException as e:
+            future.set_exception(e)
+            raise
+        finally:
+            with self._lock:
+                self._in_flight.pop(key, None)
+
+
+def _copy_result(result: SlskdSearchResult) -> SlskdSearchResult:
+    return replace(result, files=list(result.files))
+
+
+_search_cache = SearchCache()
+
+
 class SlskdService:
     """Service for interacting with SLSKD API"""
     
@@ -81,11 +203,11 @@ class SlskdService:
         self.url = url.rstrip('/')
         self.api_key = api_key
         self.settings = settings or SlskdSettings()
-        self.session = requests.Session()
-        self.session.headers.update({
+        self.session = get_session('slskd')
+        self.headers = {
             'X-API-Key': api_key,
             'Content-Type': 'application/json'
-        })
+        }
         logger.info(f"SlskdService initialized with URL: {self.url}")
     
     def test_connection(self) -> tuple[bool, str]:
@@ -103,28 +225,161 @@ class SlskdService:
             logger.error(f"SLSKD connection test failed: {e}")
             return False, str(e)
     
-    def search(self, query: str, timeout: Optional[int] = None) -> SlskdSearchResult:
+    def search(
+        self,
+        query: str,
+        timeout: Optional[int] = None,
+        early_return: bool = True,
+        use_cache: bool = True
+    ) -> SlskdSearchResult:
         """
         Search for tracks on Soulseek network
         
         Args:
             query: Search query (e.g., "Artist - Title")
             timeout: Search timeout in seconds
+            early_return: Return (and stop the search) as soon as the
+                good-enough criterion from settings is met
+            use_cache: Reuse a recent result for the same query, and join an
+                identical search that is already running
             
         Returns:
             SlskdSearchResult with found files
         """
         timeout = timeout or self.settings.search_timeout
         
-        # Submit search
-        search_id = self._submit_search(query, timeout)
-        logger.info(f"Search submitted: {search_id} for query: '{query}'")
-        
-        # Wait for results
-        result = self._wait_for_search(search_id, timeout)
+        def run() -> SlskdSearchResult:
+            # Submit search
+            search_id = self._submit_search(query, timeout)
+            logger.info(f"Search submitted: {search_id} for query: '{query}'")
+            
+            # Wait for results
+            result = self._wait_for_search(search_id, timeout, early_return)
+            result.query = query
+            return result
         
+        if not use_cache:
+            return run()
+        result = _search_cache.get_or_search(self._cache_key(query, early_return), run)
+        result.query = query
         return result
     
+    def _cache_key(self, query: str, early_return: bool) -> Tuple:
+        settings = self.settings
+        return SearchCache.key(
+            query, self.url, tuple(settings.allowed_extensions), early_return,
+            settings.max_peer_queue_length, settings.min_peer_upload_speed, settings.require_free_slot,
+            settings.min_file_size, settings.max_results
+        )
+    
+    def search_many(
+        self,
+        queries: Iterable[str],
+        timeout: Optional[int] = None,
+        max_in_flight: Optional[int] = None
+    ) -> Iterator[Tuple[str, Union[SlskdSearchResult, Exception]]]:
+        """
+        Search for many tracks concurrently
+        
+        Keeps up to max_in_flight searches running on slskd and polls just
+        those each round, so a batch takes roughly one search timeout per
+        max_in_flight queries instead of one per query. A failed poll becomes
+        that query's error; searches still running when the caller stops
+        iterating are stopped on slskd.
+        
+        Yields:
+            (query, SlskdSearchResult) as each search completes, or
+            (query, exception) for searches that failed or timed out
+        """
+        timeout = timeout or self.settings.search_timeout
+        max_in_flight = max_in_flight or self.settings.max_concurrent_searches
+        
+        pending = deque(queries)
+        active: Dict[str, Tuple[str, float]] = {}  # search_id -> (query, submitted_at)
+        
+        try:
+            yield from self._run_searches(pending, active, timeout, max_in_flight)
+        finally:
+            for search_id in active:
+                self._stop_search(search_id)
+    
+    def _run_searches(
+        self,
+        pending: deque,
+        active: Dict[str, Tuple[str, float]],
+        timeout: int,
+        max_in_flight: int
+    ) -> Iterator[Tuple[str, Union[SlskdSearchResult, Exception]]]:
+        """search_many's loop; active is shared so the caller can clean up"""
+        config = DEFAULT_POLLING_CONFIG
+        seen_files: Dict[str, int] = {}  # search_id -> file count at the last early-result check
+        interval = config['initial_interval']
+        
+        while pending or active:
+            while pending and len(active) < max_in_flight:
+                query = pending.popleft()
+                cached = _search_cache.get(self._cache_key(query, True))
+                if cached:
+                    cached.query = query
+                    yield query, cached
+                    continue
+                try:
+                    search_id = self._submit_search(query, timeout)
+                    active[search_id] = (query, time.time())
+                    logger.info(f"Search submitted: {search_id} for query: '{query}'")
+                except Exception as e:
+                    yield query, e
+            if not active:
+                continue
+            
+            time.sleep(interval)
+            statuses = self._get_search_statuses(active)
+            finished = False
+            
+            for search_id, (query, submitted_at) in list(active.items()):
+                status = statuses.get(search_id, {})
+                outcome: Union[SlskdSearchResult, Exception, None] = None
+                if isinstance(status, Exception):
+                    # Poll failed (after retries): report it for this query only
+                    outcome = status
+                    self._stop_search(search_id)
+                else:
+                    state = status.get('state', '')
+                    if 'Completed' in state:
+                        try:
+                            outcome = self._get_search_responses(search_id)
+                            outcome.query = query
+                        except Exception as e:
+                            outcome = e
+                    elif 'Errored' in state:
+                        outcome = ValueError(f"Search {search_id} failed with state: {state}")
+                    elif 'Cancelled' in state:
+                        outcome = ValueError(f"Search {search_id} was cancelled")
+                    elif 'InProgress' in state:
+                        try:
+                            outcome = self._early_result(search_id, status, seen_files)
+                        except Exception as e:
+                            logger.warning(f"Early result check failed for {search_id}: {e}")
+                        if outcome is not None:
+                            outcome.query = query
+                
+                if outcome is None and time.time() - submitted_at > timeout + config['completion_grace']:
+                    outcome = TimeoutError(f"Search {search_id} timed out after {timeout}s")
+                    self._stop_search(search_id)
+                
+                if outcome is not None:
+                    del active[search_id]
+                    seen_files.pop(search_id, None)
+                    finished = True
+                    if isinstance(outcome, SlskdSearchResult):
+                        _search_cache.put(self._cache_key(query, True), outcome)
+                    yield query, outcome
+            
+            # Poll quickly again after freeing slots, back off while nothing changes
+            interval = config['initial_interval'] if finished else min(
+                interval * config['backoff_multiplier'], config['max_interval']
+            )
+    
     def queue_download(self, files: List[Dict[str, Any]]) -> Dict[str, Any]:
         """
         Queue files for download
@@ -179,6 +434,74 @@ class SlskdService:
             "message": f"Failed to queue from {len(files)} source(s): {'; '.join(errors)}"
         }
     
+    def queue_many(self, files: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+        """
+        Queue many files, one request per peer
+        
+        Files are grouped by username and each group is sent in a single
+        request. If a peer's request fails, its files are retried one by one
+        so one bad file doesn't fail the rest.
+        
+        Args:
+            files: List of dicts with username, filename, size
+            
+        Returns:
+            One dict per file (in input order) with success, file and message
+        """
+        by_peer: Dict[str, List[int]] = {}
+        for i, file_info in enumerate(files):
+            by_peer.setdefault(file_info.get('username', ''), []).append(i)
+        
+        results: List[Optional[Dict[str, Any]]] = [None] * len(files)
+        for username, indexes in by_peer.items():
+            group = [files[i] for i in indexes]
+            try:
+                if self._queue_peer_downloads(username, group):
+                    logger.info(f"Queued {len(group)} file(s) from {username}")
+                    for i in indexes:
+                        results[i] = {"success": True, "file": files[i], "message": f"Queued from {username}"}
+                    continue
+            except Exception as e:
+                if len(group) > 1:
+                    logger.info(f"Bulk queue from {username} failed, queuing files one by one: {e}")
+                else:
+                    results[indexes[0]] = self._queue_error_result(files[indexes[0]], e)
+                    continue
+            
+            for i in indexes:
+                if results[i] is None:
+                    try:
+                        if self._queue_single_download(username, files[i].get('filename', ''), files[i].get('size')):
+                            results[i] = {"success": True, "file": files[i], "message": f"Queued from {username}"}
+                        else:
+                            results[i] = {"success": False, "file": files[i], "message": "slskd did not accept the download"}
+                    except Exception as e:
+                        results[i] = self._queue_error_result(files[i], e)
+        
+        return results
+    
+    @staticmethod
+    def _queue_error_result(file_info: Dict[str, Any], error: Exception) -> Dict[str, Any]:
+        error_str = str(error).lower()
+        # Duplicate transfer counts as success
+        if 'already in progress' in error_str or 'duplicatetransfer' in error_str:
+            return {"success": True, "file": file_info, "message": "Already in download queue"}
+        if any(pattern.lower() in error_str for pattern in NON_RETRIABLE_PATTERNS):
+            return {"success": False, "file": file_info, "message": "Source unavailable"}
+        return {"success": False, "file": file_info, "message": str(error)}
+    
+    def get_download_states(self) -> Dict[Tuple[str, str], str]:
+        """State of every download slskd knows about, keyed by (username, filename)"""
+        response = self._request_with_retry('GET', '/api/v0/transfers/downloads')
+        data = response.json()
+        states = {}
+        for user in data if isinstance(data, list) else []:
+            username = user.get('username', '')
+            for directory in user.get('directories', []):
+                for f in directory.get('files', []):
+                    states[(username, f.get('filename', ''))] = f.get('state', '')
+        return states
+    
     def _submit_search(self, query: str, timeout: int) -> str:
         """Submit a search request and return search ID"""
         response = self._request_with_retry(
@@ -186,9 +509,9 @@ class SlskdService:
             '/api/v0/searches',
             json={
                 "searchText": query,
-                "filterResponses": False,
-                "maximumPeerQueueLength": 1000000,
-                "minimumPeerUploadSpeed": 0,
+                "filterResponses": True,
+                "maximumPeerQueueLength": self.settings.max_peer_queue_length,
+                "minimumPeerUploadSpeed": self.settings.min_peer_upload_speed,
                 "minimumResponseFileCount": 1,
                 "responseLimit": 100,
                 "timeout": timeout * 1000  # Convert to ms
@@ -201,18 +524,25 @@ class SlskdService:
         
         return data['id']
     
-    def _wait_for_search(self, search_id: str, timeout: int) -> SlskdSearchResult:
+    def _wait_for_search(self, search_id: str, timeout: int, early_return: bool = False) -> SlskdSearchResult:
         """Poll for search completion and return results"""
         config = DEFAULT_POLLING_CONFIG.copy()
         config['max_wait_time'] = timeout * 1000  # Convert to ms
         
         start_time = time.time()
         current_interval = config['initial_interval']
+        seen_files: Dict[str, int] = {}
         
-        while (time.time() - start_time) < timeout:
+        # slskd completes the search at `timeout` itself: allow it a little slack to report that
+        while (time.time() - start_time) < timeout + config['completion_grace']:
             status = self._get_search_status(search_id)
             state = status.get('state', '')
             
+            if early_return and 'InProgress' in state:
+                result = self._early_result(search_id, status, seen_files)
+                if result:
+                    return result
+            
             if 'Completed' in state:
                 return self._get_search_responses(search_id)
             
@@ -238,60 +568,145 @@ class SlskdService:
         )
         return response.json()
     
+    def _get_search_statuses(self, search_ids: Iterable[str]) -> Dict[str, Union[Dict[str, Any], Exception]]:
+        """Status of each given search. Only these are requested: listing all
+        searches would grow with slskd's history. A failed poll is returned
+        as that search's exception."""
+        statuses: Dict[str, Union[Dict[str, Any], Exception]] = {}
+        for search_id in search_ids:
+            try:
+                statuses[search_id] = self._get_search_status(search_id)
+            except Exception as e:
+                statuses[search_id] = e
+        return statuses
+    
+    def _early_result(self, search_id: str, status: Dict[str, Any], seen_files: Dict[str, int]) -> Optional[SlskdSearchResult]:
+        """Results of a running search if they already meet the good-enough criterion.
+        Responses are fetched once enough files were found, then again each time the
+        count has doubled, so a popular query costs a few fetches rather than one per poll."""
+        needed = self.settings.good_enough_count
+        file_count = status.get('fileCount', 0)
+        if needed <= 0 or file_count < max(needed, 2 * seen_files.get(search_id, 0)):
+            return None
+        seen_files[search_id] = file_count
+        
+        result = self._get_search_responses(search_id)
+        if sum(1 for f in result.files if self._is_good_enough(f)) < needed:
+            return None
+        
+        logger.info(f"Search {search_id} has {needed}+ good results, stopping early")
+        self._stop_search(search_id)
+        result.state = 'Stopped'
+        return result
+    
+    def _is_good_enough(self, f: SlskdFile) -> bool:
+        return (
+            not f.is_locked
+            and f.extension in self.settings.good_enough_extensions
+            and (f.bit_rate is None or f.bit_rate >= self.settings.good_enough_min_bitrate)
+        )
+    
+    def _stop_search(self, search_id: str):
+        """Stop a running search on slskd (best effort)"""
+        try:
+            self._request_with_retry('PUT', f'/api/v0/searches/{search_id}', max_retries=0, timeout=5)
+        except Exception as e:
+            logger.warning(f"Failed to stop search {search_id}: {e}")
+    
     def _get_search_responses(self, search_id: str) -> SlskdSearchResult:
-        """Get search responses and convert to SlskdSearchResult"""
+        """Get search responses and convert to SlskdSearchResult.
+        The body is decoded one peer at a time and only the best max_results
+        files are kept, so popular queries don't cost more memory."""
         response = self._request_with_retry(
             'GET',
-            f'/api/v0/searches/{search_id}/responses'
+            f'/api/v0/searches/{search_id}/responses',
+            stream=True
         )
         
-        data = response.json()
-        user_responses = data if isinstance(data, list) else []
-        
-        files = []
-        for user_response in user_responses:
-            username = user_response.get('username', '')
-            for file_data in user_response.get('files', []):
-                ext = file_data.get('extension', '').lower().lstrip('.')
-                
-                # Filter by allowed extensions
-                if self.settings.allowed_extensions and ext not in self.settings.allowed_extensions:
-                    continue
-                
-                files.append(SlskdFile(
-                    username=username,
-                    filename=file_data.get('filename', ''),
-                    size=file_data.get('size', 0),
-                    extension=ext,
-                    bit_rate=file_data.get('bitRate'),
-                    sample_rate=file_data.get('sampleRate'),
-                    bit_depth=file_data.get('bitDepth'),
-                    length=file_data.get('length'),
-                    is_locked=file_data.get('isLocked', False)
-                ))
+        counter = [0]
+        with response:
+            user_responses = json_stream.iter_array(response.iter_content(STREAM_CHUNK_SIZE))
+            best = heapq.nsmallest(self.settings.max_results, self._iter_candidates(user_responses, counter))
         
-        # Sort by quality (FLAC > WAV > MP3 > others)
-        extension_priority = {'flac': 0, 'wav': 1, 'mp3': 2, 'ogg': 3, 'm4a': 4}
-        files.sort(key=lambda f: (
-            extension_priority.get(f.extension, 99),
-            -(f.bit_rate or 0)
-        ))
+        # Records are only built for the files that made the cut
+        files = [
+            SlskdFile(
+                username=username,
+                filename=file_data.get('filename', ''),
+                size=file_data.get('size') or 0,
+                extension=ext,
+                bit_rate=file_data.get('bitRate'),
+                sample_rate=file_data.get('sampleRate'),
+                bit_depth=file_data.get('bitDepth'),
+                length=file_data.get('length'),
+                is_locked=file_data.get('isLocked', False),
+                has_free_slot=has_free_slot,
+                queue_length=queue_length,
+                upload_speed=upload_speed
+            )
+            for _, _, ext, file_data, (username, has_free_slot, queue_length, upload_speed) in best
+        ]
         
         return SlskdSearchResult(
             search_id=search_id,
             query='',
             state='Completed',
             files=files,
-            file_count=len(files)
+            file_count=counter[0]
         )
     
+    def _iter_candidates(self, user_responses: Iterable[Any], counter: List[int]) -> Iterator[tuple]:
+        """(rank key, seq, extension, file data, peer) for each file passing the
+        peer, extension and size filters; counter[0] counts them"""
+        allowed = set(self.settings.allowed_extensions)
+        min_size = self.settings.min_file_size
+        for user_response in user_responses:
+            if not isinstance(user_response, dict):
+                continue
+            has_free_slot = bool(user_response.get('hasFreeUploadSlot', True))
+            queue_length = user_response.get('queueLength') or 0
+            upload_speed = user_response.get('uploadSpeed') or 0
+            if not self._peer_allowed(has_free_slot, queue_length, upload_speed):
+                continue
+            peer = (user_response.get('username', ''), has_free_slot, queue_length, upload_speed)
+            
+            for file_data in user_response.get('files') or []:
+                # Fields may be present but null
+                ext = (file_data.get('extension') or '').lower().lstrip('.')
+                size = file_data.get('size') or 0
+                
+                # Filter by allowed extensions and size
+                if (allowed and ext not in allowed) or size < min_size:
+                    continue
+                
+                eta = _eta_seconds(size, has_free_slot, queue_length, upload_speed)
+                key = _rank_key(ext, bool(file_data.get('isLocked')), eta, file_data.get('bitRate'))
+                yield key, counter[0], ext, file_data, peer
+                counter[0] += 1
+    
+    def _peer_allowed(self, has_free_slot: bool, queue_length: int, upload_speed: int) -> bool:
+        """Peer filters from settings (slskd applies them too, but not to every response)"""
+        settings = self.settings
+        if settings.require_free_slot and not has_free_slot:
+            return False
+        if not has_free_slot and queue_length > settings.max_peer_queue_length:
+            return False
+        return not (upload_speed and upload_speed < settings.min_peer_upload_speed)
+    
     def _queue_single_download(self, username: str, filename: str, size: Optional[int] = None) -> bool:
         """Queue a single file for download"""
+        return self._queue_peer_downloads(username, [{"filename": filename, "size": size}])
+    
+    def _queue_peer_downloads(self, username: str, files: List[Dict[str, Any]]) -> bool:
+        """Queue files from one peer in a single request"""
         encoded_username = requests.utils.quote(username, safe='')
         
-        payload = [{"filename": filename}]
-        if size:
-            payload[0]["size"] = size
+        payload = []
+        for file_info in files:
+            entry = {"filename": file_info.get('filename', '')}
+            if file_info.get('size'):
+                entry["size"] = file_info['size']
+            payload.append(entry)
         
         response = self._request_with_retry(
             'POST',
@@ -306,45 +721,15 @@ class SlskdService:
         self,
         method: str,
         path: str,
-        max_retries: int = 3,
+        max_retries: int = DEFAULT_RETRY_CONFIG['max_retries'],
         **kwargs
     ) -> requests.Response:
         """Execute request with retry logic"""
-        url = f"{self.url}{path}"
-        config = DEFAULT_RETRY_CONFIG.copy()
-        config['max_retries'] = max_retries
-        
-        last_error = None
-        
-        for attempt in range(config['max_retries'] + 1):
-            try:
-                response = self.session.request(method, url, **kwargs)
-                
-                # Check for retryable status codes
-                if response.status_code in config['retryable_status_codes']:
-                    raise requests.exceptions.HTTPError(f"Status {response.status_code}")
-                
-                response.raise_for_status()
-                return response
-                
-            except requests.exceptions.RequestException as e:
-                last_error = e
-                
-                if attempt < config['max_retries']:
-                    delay = min(
-                        config['initial_delay'] * (config['backoff_multiplier'] ** attempt),
-                        config['max_delay']
-                    )
-                    # Add jitter
-                    import random
-                    delay = delay * (0.75 + random.random() * 0.5)
-                    logger.warning(f"Request failed, retrying in {delay:.1f}s: {e}")
-                    time.sleep(delay)
-                    continue
-                
-                break
-        
-        raise last_error or Exception("Request failed")
+        kwargs['headers'] = {**self.headers, **kwargs.get('headers', {})}
+        return request_with_retry(
+            self.session, method, f"{self.url}{path}",
+            max_retries=max_retries, health='slskd', **kwargs
+        )
 
 
 def get_slskd_api_key() -> str:
@@ -357,8 +742,27 @@ def is_slskd_configured() -> bool:
     return bool(get_slskd_api_key())
 
 
+def _probe_slskd() -> Optional[bool]:
+    service = get_slskd_service()
+    if not service:
+        return None
+    response = service.session.get(
+        f"{service.url}/api/v0/application", headers=service.headers, timeout=5
+    )
+    return response.status_code == 200
+
+
+health_registry.register('slskd', _probe_slskd)
+
+
+# Service built from the current slskd_* settings, rebuilt only when they change
+_service: Optional[Tuple[tuple, SlskdService]] = None
+_service_lock = threading.Lock()
+
+
 def get_slskd_service() -> Optional[SlskdService]:
     """Get configured SLSKD service instance"""
+    global _service
     from .config import load_settings
     
     api_key = get_slskd_api_key()
@@ -368,6 +772,10 @@ def get_slskd_service() -> Optional[SlskdService]:
     settings_data = load_settings()
     
     url = settings_data.get('slskd_url', os.environ.get('SLSKD_URL', 'http://localhost:5030'))
+    key = (api_key, url, tuple(sorted((k, repr(v)) for k, v in settings_data.items() if k.startswith('slskd_'))))
+    with _service_lock:
+        if _service and _service[0] == key:
+            return _service[1]
     
     slskd_settings = SlskdSettings(
         enabled=settings_data.get('slskd_enabled', False),
@@ -375,7 +783,18 @@ def get_slskd_service() -> Optional[SlskdService]:
         allowed_extensions=settings_data.get('slskd_allowed_extensions', ['flac', 'mp3', 'wav', 'ogg', 'm4a']),
         search_timeout=settings_data.get('slskd_search_timeout', 10),
         max_results=settings_data.get('slskd_max_results', 50),
-        download_attempts=settings_data.get('slskd_download_attempts', 3)
+        download_attempts=settings_data.get('slskd_download_attempts', 3),
+        max_concurrent_searches=settings_data.get('slskd_max_concurrent_searches', 5),
+        good_enough_count=settings_data.get('slskd_good_enough_count', 3),
+        good_enough_extensions=settings_data.get('slskd_good_enough_extensions', ['flac']),
+        good_enough_min_bitrate=settings_data.get('slskd_good_enough_min_bitrate', 0),
+        max_peer_queue_length=settings_data.get('slskd_max_peer_queue_length', 100),
+        min_peer_upload_speed=settings_data.get('slskd_min_peer_upload_speed', 0),
+        require_free_slot=settings_data.get('slskd_require_free_slot', False),
+        min_file_size=settings_data.get('slskd_min_file_size', 100_000)
     )
     
-    return SlskdService(url, api_key, slskd_settings)
+    service = SlskdService(url, api_key, slskd_settings)
+    with _service_lock:
+        _service = (key, service)
+    return service
@@ -0,0 +1,157 @@
+"""
+Persistent cache of fetched Spotify playlists
+Entries are validated by a version tag: the playlist's snapshot_id for the
+Spotify API, or a hash of the response body for the scraper.
+"""
+import os
+import json
+import time
+import hashlib
+import logging
+import tempfile
+import threading
+from dataclasses import astuple, fields
+from typing import Optional, Tuple
+
+from . import json_stream
+from .config import CONFIG_DIR
+from .spotify_service import SpotifyPlaylist, SpotifyTrack
+
+logger = logging.getLogger(__name__)
+
+CACHE_DIR = os.path.join(CONFIG_DIR, "spotify_cache")
+
+_TRACK_FIELDS = [f.name for f in fields(SpotifyTrack)]
+
+
+class SpotifyPlaylistCache:
+    """One JSON file per playlist: {version, fetched_at, playlist}"""
+
+    def __init__(self, cache_dir: str = CACHE_DIR):
+        self.cache_dir = cache_dir
+        self._lock = threading.Lock()
+
+    def _file(self, key: str) -> str:
+        name = hashlib.sha1(key.encode()).hexdigest()
+        return os.path.join(self.cache_dir, f"{name}.json")
+
+    def load(self, key: str) -> Optional[Tuple[str, float, SpotifyPlaylist]]:
+        """(version, fetched_at, playlist) for a key, or None"""
+        path = self._file(key)
+        try:
+            with open(path, "r") as f:
+                entry = json.load(f)
+            data = entry["playlist"]
+            tracks = [SpotifyTrack(**dict(zip(_TRACK_FIELDS, row))) for row in data.pop("tracks")]
+            # The file's mtime is the fetch time, so touch() can renew an entry
+            return entry["version"], os.path.getmtime(path), SpotifyPlaylist(tracks=tracks, **data)
+        except FileNotFoundError:
+            return None
+        except Exception as e:
+            logger.warning(f"Ignoring unreadable Spotify cache entry {key}: {e}")
+            return None
+
+    def fetched_at(self, key: str) -> Optional[float]:
+        """When an entry was fetched (or last renewed), without reading it; None if missing"""
+        try:
+            return os.path.getmtime(self._file(key))
+        except OSError:
+            return None
+
+    def peek(self, key: str) -> Optional[Tuple[str, float]]:
+        """(version, fetched_at) without decoding the tracks, or None"""
+        path = self._file(key)
+        try:
+            with open(path, "rb") as f:
+                # version is written first, so only the start of the file is read
+                for name, value in json_stream.iter_object(iter(lambda: f.read(4096), b"")):
+                    if name == "version":
+                        return value, os.path.getmtime(path)
+        except FileNotFoundError:
+            return None
+        except Exception as e:
+            logger.warning(f"Ignoring unreadable Spotify cache entry {key}: {e}")
+        return None
+
+    def touch(self, key: str):
+        """Renew an entry whose content was confirmed unchanged"""
+        try:
+            os.utime(self._file(key))
+        except OSError as e:
+            logger.warning(f"Could not renew Spotify cache entry {key}: {e}")
+
+    def writer(self, key: str) -> "CacheEntryWriter":
+        return CacheEntryWriter(self, key)
+
+    def get(self, key: str, version: str) -> Optional[SpotifyPlaylist]:
+        """Cached playlist if it was stored with the same version"""
+        cached = self.load(key)
+        if cached and cached[0] == version:
+            return cached[2]
+        return None
+
+    def put(self, key: str, version: str, playlist: SpotifyPlaylist):
+        data = {f.name: getattr(playlist, f.name) for f in fields(SpotifyPlaylist) if f.name != "tracks"}
+        data["tracks"] = [astuple(t) for t in playlist.tracks]
+        entry = {"version": version, "fetched_at": time.time(), "playlist": data}
+
+        path = self._file(key)
+        with self._lock:
+            try:
+                os.makedirs(self.cache_dir, exist_ok=True)
+                tmp = f"{path}.tmp"
+                with open(tmp, "w") as f:
+                    json.dump(entry, f)
+                os.replace(tmp, path)
+            except OSError as e:
+                logger.warning(f"Could not write Spotify cache entry {key}: {e}")
+
+
+class CacheEntryWriter:
+    """Builds a cache entry while tracks stream in. Tracks are spilled to a
+    temporary file rather than kept in memory; commit() writes the entry."""
+
+    def __init__(self, cache: SpotifyPlaylistCache, key: str):
+        self._cache = cache
+        self._key = key
+        self._spill = tempfile.TemporaryFile("w+")
+        self._count = 0
+
+    def add(self, track: SpotifyTrack):
+        self._spill.write(("," if self._count else "") + json.dumps(astuple(track)))
+        self._count += 1
+
+    def commit(self, version: str, playlist: SpotifyPlaylist):
+        """Write the entry; playlist supplies the header (its tracks are ignored)"""
+        data = {f.name: getattr(playlist, f.name) for f in fields(SpotifyPlaylist) if f.name != "tracks"}
+        path = self._cache._file(self._key)
+        with self._cache._lock:
+            try:
+                os.makedirs(self._cache.cache_dir, exist_ok=True)
+                tmp = f"{path}.tmp"
+                with open(tmp, "w") as f:
+                    f.write('{"version": %s, "fetched_at": %s, "playlist": ' % (json.dumps(version), time.time()))
+                    f.write(json.dumps(data)[:-1] + ', "tracks": [')
+                    self._spill.seek(0)
+                    while chunk := self._spill.read(1 << 16):
+                        f.write(chunk)
+                    f.write(']}}')
+                os.replace(tmp, path)
+            except OSError as e:
+                logger.warning(f"Could not write Spotify cache entry {self._key}: {e}")
+        self.discard()
+
+    def discard(self):
+        self._spill.close()
+
+
+_cache: Optional[SpotifyPlaylistCache] = None
+_cache_lock = threading.Lock()
+
+
+def get_playlist_cache() -> SpotifyPlaylistCache:
+    global _cache
+    with _cache_lock:
+        if _cache is None:
+            _cache = SpotifyPlaylistCache()
+        return _cache
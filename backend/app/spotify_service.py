@@ -1,16 +1,26 @@
 """
 Spotify Playlist Service - через внешний scraper или официальный API
 """
-from typing import Optional, List
+from typing import Iterator, Optional, List
 from urllib.parse import urlparse
 import logging
 import os
+import time
+import random
+import hashlib
 import requests
-from dataclasses import dataclass
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass, replace
+
+from . import json_stream
+from .health import registry as health_registry, CircuitOpenError
+from .http_client import get_session, request_with_retry
+from .m3u_parser import Track
 
 try:
     import spotipy
     from spotipy.oauth2 import SpotifyClientCredentials
+    from spotipy.exceptions import SpotifyException
     SPOTIPY_AVAILABLE = True
 except ImportError:
     SPOTIPY_AVAILABLE = False
@@ -20,6 +30,32 @@ logger = logging.getLogger(__name__)
 # Scraper service URL (spotify-to-plex scraper)
 SCRAPER_URL = os.environ.get('SPOTIFY_SCRAPER_URL', 'http://localhost:3020')
 
+# Scraper has no cheap "has it changed" check, so cached playlists are reused
+# for this long without any request (seconds)
+SCRAPER_CACHE_TTL = int(os.environ.get('SPOTIFY_SCRAPER_CACHE_TTL', '3600'))
+
+# Read size for streamed scraper responses
+STREAM_CHUNK_SIZE = 64 * 1024
+
+# Spotify API pagination: pages after the first are fetched concurrently by offset
+PAGE_SIZE = 100
+PAGE_FETCH_WORKERS = int(os.environ.get('SPOTIFY_PAGE_FETCH_WORKERS', '6'))
+# Only the fields the importer reads (Spotify Web API `fields` projection);
+# drops available_markets, album images, external_urls etc. from every track
+TRACK_ITEM_FIELDS = "track(name,uri,duration_ms,album(name),artists(name),external_ids(isrc))"
+PLAYLIST_FIELDS = (
+    "name,description,snapshot_id,owner(display_name),images(url),"
+    f"tracks(total,limit,items({TRACK_ITEM_FIELDS}))"
+)
+PAGE_FIELDS = f"items({TRACK_ITEM_FIELDS})"
+
+PAGE_RETRY_CONFIG = {
+    "max_retries": 4,
+    "initial_delay": 1.0,
+    "max_delay": 30.0,
+    "retryable_status_codes": [429, 500, 502, 503, 504]
+}
+
 
 @dataclass
 class SpotifyTrack:
@@ -29,6 +65,18 @@ class SpotifyTrack:
     album: Optional[str] = None
     duration_ms: Optional[int] = None
     uri: Optional[str] = None
+    isrc: Optional[str] = None
+    
+    def to_track(self) -> Track:
+        """Track для сопоставления с библиотекой Plex"""
+        return Track(
+            filename=f"{self.artist} - {self.title}",
+            path=f"spotify:{self.uri or ''}",
+            title=self.title,
+            artist=self.artist,
+            duration=self.duration_ms // 1000 if self.duration_ms else None,
+            isrc=self.isrc
+        )
 
 
 @dataclass
@@ -43,6 +91,47 @@ class SpotifyPlaylist:
     total_tracks: int = 0
 
 
+def _isrc(track_data: dict) -> Optional[str]:
+    """ISRC из external_ids трека, если есть"""
+    external_ids = track_data.get('external_ids')
+    return external_ids.get('isrc') if isinstance(external_ids, dict) else None
+
+
+def _scraper_track(track_data: dict) -> SpotifyTrack:
+    """SpotifyTrack из трека в ответе scraper"""
+    artists = track_data.get('artists', [])
+    artist_name = artists[0].get('name', 'Unknown') if artists else 'Unknown'
+    
+    return SpotifyTrack(
+        title=track_data.get('name', 'Unknown'),
+        artist=artist_name,
+        album=track_data.get('album', {}).get('name') if isinstance(track_data.get('album'), dict) else None,
+        duration_ms=track_data.get('duration_ms'),
+        uri=track_data.get('uri'),
+        isrc=_isrc(track_data)
+    )
+
+
+def _track_from_item(item: dict) -> Optional[SpotifyTrack]:
+    """SpotifyTrack из элемента playlist items (None для удалённых/локальных)"""
+    track_data = item.get('track')
+    if not track_data:
+        return None
+    
+    # Extract artist names
+    artists = track_data.get('artists', [])
+    artist_name = artists[0]['name'] if artists else 'Unknown Artist'
+    
+    return SpotifyTrack(
+        title=track_data.get('name', 'Unknown'),
+        artist=artist_name,
+        album=(track_data.get('album') or {}).get('name'),
+        duration_ms=track_data.get('duration_ms'),
+        uri=track_data.get('uri'),
+        isrc=_isrc(track_data)
+    )
+
+
 class SpotifyScraperService:
     """Сервис для работы со Spotify через внешний scraper (обход гео-блокировок)"""
     
@@ -52,41 +141,80 @@ class SpotifyScraperService:
     
     def get_playlist(self, url: str) -> SpotifyPlaylist:
         """Получение плейлиста через scraper сервис"""
+        info = {}
+        tracks = list(self.iter_tracks(url, info))
+        return replace(info['playlist'], tracks=tracks)
+    
+    def iter_tracks(self, url: str, info: dict) -> Iterator[SpotifyTrack]:
+        """
+        Треки плейлиста по мере декодирования ответа scraper (потоково)
+        
+        Matching can start before the download finishes. Tracks are not kept in
+        memory: once the iterator is exhausted, info['playlist'] holds the
+        playlist header with an empty track list.
+        """
         if not SpotifyService.is_valid_url(url):
             raise ValueError("Невалидный Spotify URL")
         
+        from .spotify_cache import get_playlist_cache
+        cache = get_playlist_cache()
+        cache_key = f"scraper:{SpotifyService.extract_playlist_id(url)}"
+        fetched_at = cache.fetched_at(cache_key)
+        if fetched_at and time.time() - fetched_at < SCRAPER_CACHE_TTL:
+            entry = cache.load(cache_key)
+            if entry:
+                logger.info(f"Using cached playlist for {url}")
+                info['playlist'] = replace(entry[2], url=url, tracks=[])
+                yield from entry[2].tracks
+                return
+        # Stale or missing: only the version is needed, to spot unchanged content
+        cached = cache.peek(cache_key)
+        
+        writer = cache.writer(cache_key)
         try:
             logger.info(f"Fetching playlist via scraper: {url}")
             
-            response = requests.post(
+            # Scraping is slow: one retry at most, a timed-out scrape won't succeed faster
+            response = request_with_retry(
+                get_session("spotify_scraper"),
+                "POST",
                 f"{self.scraper_url}/playlist",
+                max_retries=1,
+                retry_read_timeouts=False,
+                health="spotify_scraper",
                 json={"url": url, "include_album_data": False},
-                timeout=120
+                timeout=120,
+                stream=True
             )
             
-            if response.status_code != 200:
-                raise ValueError(f"Scraper error: {response.status_code}")
-            
-            data = response.json()
-            
-            tracks = []
-            for track_data in data.get('tracks', []):
-                artists = track_data.get('artists', [])
-                artist_name = artists[0].get('name', 'Unknown') if artists else 'Unknown'
+            with response:
+                if response.status_code != 200:
+                    raise ValueError(f"Scraper error: {response.status_code}")
+                
+                digest = hashlib.sha256()
                 
-                track = SpotifyTrack(
-                    title=track_data.get('name', 'Unknown'),
-                    artist=artist_name,
-                    album=track_data.get('album', {}).get('name') if isinstance(track_data.get('album'), dict) else None,
-                    duration_ms=track_data.get('duration_ms'),
-                    uri=track_data.get('uri')
-                )
-                tracks.append(track)
+                def chunks():
+                    for chunk in response.iter_content(STREAM_CHUNK_SIZE):
+                        digest.update(chunk)
+                        yield chunk
+                
+                # Decode the body incrementally: tracks are yielded one by one and
+                # spilled to the cache writer, other top-level keys form the header
+                data = {}
+                count = 0
+                for key, value in json_stream.iter_object(chunks(), stream_keys={'tracks'}):
+                    if key != 'tracks':
+                        data[key] = value
+                    elif isinstance(value, dict):
+                        track = _scraper_track(value)
+                        writer.add(track)
+                        count += 1
+                        yield track
             
-            images = data.get('images', [])
+            images = data.get('images') or []
             image_url = None
             for img in images:
-                if isinstance(img, dict) and img.get('height', 0) >= 300:
+                if isinstance(img, dict) and (img.get('height') or 0) >= 300:
                     image_url = img.get('url')
                     break
             if not image_url and images:
@@ -97,19 +225,30 @@ class SpotifyScraperService:
                 description=data.get('description'),
                 owner=data.get('owner', {}).get('name', 'Unknown') if isinstance(data.get('owner'), dict) else 'Unknown',
                 url=url,
-                tracks=tracks,
+                tracks=[],
                 image_url=image_url,
-                total_tracks=data.get('track_count', len(tracks))
+                total_tracks=data.get('track_count', count)
             )
+            # Unchanged content: keep the cached entry and restart its TTL
+            version = digest.hexdigest()
+            if cached and cached[0] == version:
+                cache.touch(cache_key)
+            else:
+                writer.commit(version, playlist)
+            info['playlist'] = playlist
             
-            logger.info(f"Successfully fetched playlist: {playlist.name} ({len(tracks)} tracks)")
-            return playlist
+            logger.info(f"Successfully fetched playlist: {playlist.name} ({count} tracks)")
             
+        except CircuitOpenError:
+            raise
         except requests.exceptions.Timeout:
             raise ValueError("Scraper timeout - плейлист слишком большой или сервис недоступен")
         except Exception as e:
             logger.error(f"Scraper error: {e}")
             raise ValueError(f"Ошибка scraper: {str(e)}")
+        finally:
+            # Closes the spill file on every path (commit() has already used it)
+            writer.discard()
 
 
 class SpotifyService:
@@ -125,11 +264,13 @@ class SpotifyService:
         if not self.client_id or not self.client_secret:
             raise ValueError("Spotify credentials not configured")
         
+        session = get_session("spotify")
         auth_manager = SpotifyClientCredentials(
             client_id=self.client_id,
-            client_secret=self.client_secret
+            client_secret=self.client_secret,
+            requests_session=session
         )
-        self.client = spotipy.Spotify(auth_manager=auth_manager)
+        self.client = spotipy.Spotify(auth_manager=auth_manager, requests_session=session)
         logger.info("SpotifyService initialized with API credentials")
     
     @staticmethod
@@ -157,6 +298,38 @@ class SpotifyService:
             pass
         return None
     
+    def _fetch_page(self, playlist_id: str, offset: int) -> dict:
+        """Страница треков плейлиста с повтором при 429/5xx (учитывает Retry-After)"""
+        return self._call_with_retry(
+            f"Page at offset {offset}", self.client.playlist_items,
+            playlist_id, fields=PAGE_FIELDS, offset=offset, limit=PAGE_SIZE, additional_types=('track',)
+        )
+    
+    def _call_with_retry(self, what: str, method, *args, **kwargs):
+        """Вызов Spotify API с повтором при 429/5xx (учитывает Retry-After).
+        The shared pooled session has no urllib3 Retry adapter, so spotipy's
+        own status retries don't apply; every API call goes through here."""
+        config = PAGE_RETRY_CONFIG
+        for attempt in range(config['max_retries'] + 1):
+            try:
+                return method(*args, **kwargs)
+            except SpotifyException as e:
+                if e.http_status not in config['retryable_status_codes'] or attempt == config['max_retries']:
+                    raise
+                retry_after = (e.headers or {}).get('Retry-After')
+                if retry_after and str(retry_after).isdigit():
+                    delay = float(retry_after)
+                else:
+                    delay = config['initial_delay'] * (2 ** attempt) * (0.75 + random.random() * 0.5)
+                delay = min(delay, config['max_delay'])
+                logger.warning(f"{what} failed ({e.http_status}), retrying in {delay:.1f}s")
+                time.sleep(delay)
+    
+    def iter_tracks(self, url: str, info: dict) -> Iterator[SpotifyTrack]:
+        """Same interface as SpotifyScraperService.iter_tracks (pages are fetched up front)"""
+        info['playlist'] = self.get_playlist(url)
+        yield from info['playlist'].tracks
+    
     def get_playlist(self, url: str) -> SpotifyPlaylist:
         """
         Получение плейлиста по URL через Spotify API
@@ -174,40 +347,43 @@ class SpotifyService:
         if not playlist_id:
             raise ValueError("Не удалось извлечь ID плейлиста")
         
+        from .spotify_cache import get_playlist_cache
+        cache = get_playlist_cache()
+        cache_key = f"api:{playlist_id}"
+        
         try:
+            # Cheap metadata check: snapshot_id changes whenever the playlist does
+            snapshot_id = self._call_with_retry(
+                "Playlist snapshot check", self.client.playlist, playlist_id, fields='snapshot_id'
+            ).get('snapshot_id')
+            cached = cache.get(cache_key, snapshot_id) if snapshot_id else None
+            if cached:
+                logger.info(f"Playlist {playlist_id} unchanged (snapshot {snapshot_id}), using cache")
+                return replace(cached, url=url)
+            
             logger.info(f"Fetching playlist: {playlist_id}")
             
-            # Get playlist info
-            playlist_data = self.client.playlist(playlist_id)
+            # Get playlist info (slim payload, see PLAYLIST_FIELDS)
+            playlist_data = self._call_with_retry(
+                "Playlist request", self.client.playlist, playlist_id, fields=PLAYLIST_FIELDS
+            )
             
-            # Get all tracks (handle pagination)
-            tracks = []
-            results = playlist_data['tracks']
+            # First page comes with the playlist; it reports the total, so the
+            # remaining pages are fetched concurrently and reassembled in order
+            first_page = playlist_data['tracks']
+            pages = [first_page]
+            offsets = range(first_page.get('limit') or PAGE_SIZE, first_page.get('total', 0), PAGE_SIZE)
+            if offsets:
+                workers = min(PAGE_FETCH_WORKERS, len(offsets))
+                with ThreadPoolExecutor(max_workers=workers) as pool:
+                    pages.extend(pool.map(lambda offset: self._fetch_page(playlist_id, offset), offsets))
             
-            while True:
-                for item in results['items']:
-                    track_data = item.get('track')
-                    if not track_data:
-                        continue
-                    
-                    # Extract artist names
-                    artists = track_data.get('artists', [])
-                    artist_name = artists[0]['name'] if artists else 'Unknown Artist'
-                    
-                    track = SpotifyTrack(
-                        title=track_data.get('name', 'Unknown'),
-                        artist=artist_name,
-                        album=track_data.get('album', {}).get('name'),
-                        duration_ms=track_data.get('duration_ms'),
-                        uri=track_data.get('uri')
-                    )
-                    tracks.append(track)
-                
-                # Check for more pages
-                if results['next']:
-                    results = self.client.next(results)
-                else:
-                    break
+            tracks = []
+            for page in pages:
+                for item in page['items']:
+                    track = _track_from_item(item)
+                    if track:
+                        tracks.append(track)
             
             # Extract image
             images = playlist_data.get('images', [])
@@ -222,6 +398,8 @@ class SpotifyService:
                 image_url=image_url,
                 total_tracks=playlist_data.get('tracks', {}).get('total', len(tracks))
             )
+            if playlist_data.get('snapshot_id'):
+                cache.put(cache_key, playlist_data['snapshot_id'], playlist)
             
             logger.info(f"Successfully fetched playlist: {playlist.name} ({len(tracks)} tracks)")
             return playlist
@@ -231,13 +409,17 @@ class SpotifyService:
             raise ValueError(f"Ошибка при получении плейлиста: {str(e)}")
 
 
+def _probe_scraper() -> bool:
+    response = get_session("spotify_scraper").get(f"{SCRAPER_URL}/health", timeout=5)
+    return response.status_code == 200
+
+
+health_registry.register("spotify_scraper", _probe_scraper)
+
+
 def is_scraper_available() -> bool:
-    """Проверка доступности Spotify scraper сервиса"""
-    try:
-        response = requests.get(f"{SCRAPER_URL}/health", timeout=5)
-        return response.status_code == 200
-    except:
-        return False
+    """Проверка доступности Spotify scraper сервиса (кэшированный статус из health registry)"""
+    return health_registry.is_up("spotify_scraper")
 
 
 def is_spotify_available() -> bool:
@@ -249,23 +431,29 @@ def is_spotify_configured() -> bool:
     """Проверка настроены ли Spotify (scraper доступен или API credentials)"""
     if is_scraper_available():
         return True
-    from .config import load_settings
-    settings = load_settings()
-    client_id = settings.get('spotify_client_id', '')
-    client_secret = settings.get('spotify_client_secret', '')
-    return bool(client_id and client_secret)
+    from .config import get_settings
+    settings = get_settings()
+    return bool(settings.spotify_client_id and settings.spotify_client_secret)
+
+
+# Сервисы переиспользуются между запросами; API-клиент пересоздаётся только при смене credentials
+_scraper_service: Optional[SpotifyScraperService] = None
+_api_service: Optional[tuple] = None  # ((client_id, client_secret), SpotifyService)
 
 
 def get_spotify_service():
     """Получение Spotify сервиса (предпочитаем scraper для обхода гео-блокировок)"""
+    global _scraper_service, _api_service
     # Сначала пробуем scraper (обходит гео-блокировки)
     if is_scraper_available():
-        return SpotifyScraperService()
+        if _scraper_service is None:
+            _scraper_service = SpotifyScraperService()
+        return _scraper_service
     
     # Fallback на прямой API
-    from .config import load_settings
-    settings = load_settings()
-    return SpotifyService(
-        client_id=settings.get('spotify_client_id', ''),
-        client_secret=settings.get('spotify_client_secret', '')
-    )
+    from .config import get_settings
+    settings = get_settings()
+    key = (settings.spotify_client_id, settings.spotify_client_secret)
+    if _api_service is None or _api_service[0] != key:
+        _api_service = (key, SpotifyService(client_id=key[0], client_secret=key[1]))
+    return _api_service[1]
@@ -0,0 +1,167 @@
+"""
+Embedded tag reader for local tracks
+Reads artist/title/album/MusicBrainz IDs from the audio files an m3u points to,
+so matching doesn't depend on guesses from the filename.
+Results are cached in a SQLite index keyed by path and mtime.
+"""
+import os
+import sqlite3
+import logging
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass
+from itertools import islice
+from typing import Dict, Iterable, Iterator, List, Optional, Tuple
+
+from .config import CONFIG_DIR
+from .m3u_parser import Track
+
+try:
+    import mutagen
+    MUTAGEN_AVAILABLE = True
+except ImportError:
+    MUTAGEN_AVAILABLE = False
+
+logger = logging.getLogger(__name__)
+
+TAG_INDEX_FILE = os.path.join(CONFIG_DIR, "tag_index.db")
+
+# Tracks are stat'ed and read in batches of this size
+BATCH_SIZE = 256
+
+
+@dataclass(slots=True)
+class TrackTags:
+    """Tags read from an audio file (any field may be missing)"""
+    artist: Optional[str] = None
+    title: Optional[str] = None
+    album: Optional[str] = None
+    mbid: Optional[str] = None
+
+
+class TagIndex:
+    """Persistent cache of TrackTags keyed by file path; entries are valid while mtime matches"""
+
+    def __init__(self, db_path: str = TAG_INDEX_FILE):
+        os.makedirs(os.path.dirname(db_path), exist_ok=True)
+        self._lock = threading.Lock()
+        # WAL and a busy timeout: several worker processes may share the index
+        self._conn = sqlite3.connect(db_path, timeout=30, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS tags ("
+            "path TEXT PRIMARY KEY, mtime REAL, artist TEXT, title TEXT, album TEXT, mbid TEXT)"
+        )
+        self._conn.commit()
+
+    def get_many(self, entries: List[Tuple[str, float]]) -> Dict[str, TrackTags]:
+        """Cached tags for (path, mtime) pairs whose mtime is unchanged"""
+        found = {}
+        with self._lock:
+            for path, mtime in entries:
+                row = self._conn.execute(
+                    "SELECT mtime, artist, title, album, mbid FROM tags WHERE path = ?", (path,)
+                ).fetchone()
+                if row and row[0] == mtime:
+                    found[path] = TrackTags(*row[1:])
+        return found
+
+    def put_many(self, entries: List[Tuple[str, float, TrackTags]]):
+        with self._lock:
+            self._conn.executemany(
+                "INSERT OR REPLACE INTO tags VALUES (?, ?, ?, ?, ?, ?)",
+                [(path, mtime, t.artist, t.title, t.album, t.mbid) for path, mtime, t in entries]
+            )
+            self._conn.commit()
+
+
+def _first(tags, key: str) -> Optional[str]:
+    values = tags.get(key) if tags else None
+    if values:
+        value = str(values[0]).strip()
+        return value or None
+    return None
+
+
+def read_tags(path: str) -> TrackTags:
+    """Read embedded tags from an audio file (empty TrackTags if unreadable)"""
+    try:
+        audio = mutagen.File(path, easy=True)
+    except Exception as e:
+        logger.debug("Could not read tags from %s: %s", path, e)
+        return TrackTags()
+    if audio is None:
+        return TrackTags()
+
+    tags = audio.tags
+    return TrackTags(
+        artist=_first(tags, 'artist'),
+        title=_first(tags, 'title'),
+        album=_first(tags, 'album'),
+        mbid=_first(tags, 'musicbrainz_trackid')
+    )
+
+
+def _mtime(path: str) -> Optional[float]:
+    try:
+        return os.stat(path).st_mtime
+    except OSError:
+        return None
+
+
+def _apply(track: Track, tags: TrackTags):
+    """Embedded tags win over values guessed from #EXTINF or the filename"""
+    if tags.title:
+        track.title = tags.title
+    if tags.artist:
+        track.artist = tags.artist
+    if tags.album:
+        track.album = tags.album
+    if tags.mbid:
+        track.mbid = tags.mbid
+
+
+def enrich_tracks(tracks: Iterable[Track], index: "TagIndex", workers: int = 8) -> Iterator[Track]:
+    """Yield tracks with embedded tags applied, reading files in parallel.
+    Works batch by batch, so lazy iter_m3u streams stay lazy.
+    """
+    if not MUTAGEN_AVAILABLE:
+        logger.warning("mutagen not installed, embedded tags are not read")
+        yield from tracks
+        return
+
+    tracks = iter(tracks)
+    with ThreadPoolExecutor(max_workers=workers) as pool:
+        while True:
+            batch = list(islice(tracks, BATCH_SIZE))
+            if not batch:
+                break
+
+            paths = [t.path for t in batch]
+            mtimes = dict(zip(paths, pool.map(_mtime, paths)))
+            existing = [(p, m) for p, m in mtimes.items() if m is not None]
+
+            found = index.get_many(existing)
+            missing = [(p, m) for p, m in existing if p not in found]
+            if missing:
+                read = list(pool.map(read_tags, [p for p, _ in missing]))
+                index.put_many([(p, m, t) for (p, m), t in zip(missing, read)])
+                found.update((p, t) for (p, _), t in zip(missing, read))
+
+            for track in batch:
+                tags = found.get(track.path)
+                if tags:
+                    _apply(track, tags)
+                yield track
+
+
+_tag_index: Optional[TagIndex] = None
+_tag_index_lock = threading.Lock()
+
+
+def get_tag_index() -> TagIndex:
+    global _tag_index
+    with _tag_index_lock:
+        if _tag_index is None:
+            _tag_index = TagIndex()
+        return _tag_index
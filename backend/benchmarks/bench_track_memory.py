@@ -0,0 +1,74 @@
+"""
+Memory benchmark: parsed playlist tracks as plain dataclasses vs TrackColumns.
+
+Builds a synthetic corpus of 1M m3u-style entries (shared artist folders,
+unique titles) and measures the traced heap size of each representation.
+
+Usage (from backend/):
+    python -m benchmarks.bench_track_memory [entries]
+"""
+import gc
+import os
+import sys
+import tracemalloc
+from dataclasses import dataclass
+from typing import Optional
+
+from app.m3u_parser import Track, TrackColumns
+
+ARTISTS = 5000
+ALBUMS_PER_ARTIST = 4
+
+
+@dataclass
+class DictTrack:
+    """Track as it was before slots/columns: one __dict__ per instance"""
+    filename: str
+    path: str
+    title: Optional[str] = None
+    artist: Optional[str] = None
+    duration: Optional[int] = None
+
+
+def synthetic_entries(count: int):
+    """Yield (filename, path, title, artist, duration) like iter_m3u would produce"""
+    for i in range(count):
+        a = i % ARTISTS
+        artist = f"Artist {a:05d}"
+        folder = f"/music/Artists/{artist}/Album {i % ALBUMS_PER_ARTIST}"
+        title = f"Song number {i:07d}"
+        filename = f"{i % 20 + 1:02d} - {artist} - {title}.flac"
+        # Fresh string objects per entry, as a line-by-line parser creates them
+        yield filename, os.path.join(folder, filename), title, "".join(artist), 180 + i % 240
+
+
+def measure(build) -> int:
+    gc.collect()
+    tracemalloc.start()
+    obj = build()
+    size, _ = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    del obj
+    gc.collect()
+    return size
+
+
+def main():
+    count = int(sys.argv[1]) if len(sys.argv) > 1 else 1_000_000
+
+    results = [
+        ("list[dataclass] (before)", lambda: [DictTrack(*e) for e in synthetic_entries(count)]),
+        ("list[Track] (slots)", lambda: [Track(*e) for e in synthetic_entries(count)]),
+        ("TrackColumns", lambda: TrackColumns(Track(*e) for e in synthetic_entries(count))),
+    ]
+
+    print(f"{count:,} entries")
+    baseline = None
+    for label, build in results:
+        size = measure(build)
+        baseline = baseline or size
+        print(f"  {label:<26} {size / 2 ** 20:8.1f} MiB  ({size / baseline:5.1%})")
+
+
+if __name__ == "__main__":
+    main()
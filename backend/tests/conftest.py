@@ -0,0 +1,15 @@
+"""
+Test fixtures - run the suite from backend/ with `python -m pytest`
+"""
+import pytest
+
+from app import shared_store
+from app.shared_store import SharedStore
+
+
+@pytest.fixture
+def store(tmp_path, monkeypatch):
+    """A fresh shared store in a temporary directory, used by get_store() too"""
+    store = SharedStore(str(tmp_path / "state.db"))
+    monkeypatch.setattr(shared_store, "_store", store)
+    return store
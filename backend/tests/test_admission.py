@@ -0,0 +1,238 @@
+"""
+Admission control - slot ordering, 429s and release on every exit path
+"""
+import asyncio
+
+import pytest
+from fastapi import Depends, FastAPI, HTTPException
+from fastapi.responses import StreamingResponse
+
+from app import admission
+from app.admission import Limiter
+
+
+def make_limiter(limit=1, max_queue=8, queue_timeout=5.0):
+    return Limiter("test", limit=limit, max_queue=max_queue, queue_timeout=queue_timeout, retry_after=7)
+
+
+def test_slots_are_handed_out_in_arrival_order():
+    async def scenario():
+        limiter = make_limiter()
+        order = []
+
+        async def worker(n):
+            await limiter.acquire()
+            order.append(n)
+
+        await limiter.acquire()
+        tasks = [asyncio.create_task(worker(n)) for n in range(3)]
+        await asyncio.sleep(0)
+        assert limiter.stats()["queued"] == 3
+        for _ in range(3):
+            limiter.release()
+            await asyncio.sleep(0)
+        await asyncio.gather(*tasks)
+        limiter.release()
+        return order, limiter.stats()
+
+    order, stats = asyncio.run(scenario())
+    assert order == [0, 1, 2]
+    assert stats["active"] == 0 and stats["queued"] == 0
+
+
+def test_released_slot_is_not_overtaken_by_new_request():
+    async def scenario():
+        limiter = make_limiter()
+        await limiter.acquire()
+        waiter = asyncio.create_task(limiter.acquire())
+        await asyncio.sleep(0)
+        limiter.release()
+        # The slot already belongs to the waiter, so a newcomer has to queue
+        newcomer = asyncio.create_task(limiter.acquire())
+        await asyncio.sleep(0)
+        await waiter
+        assert not newcomer.done()
+        limiter.release()
+        await newcomer
+        limiter.release()
+        return limiter.stats()
+
+    assert asyncio.run(scenario())["active"] == 0
+
+
+def test_full_queue_is_rejected_with_retry_after():
+    async def scenario():
+        limiter = make_limiter(max_queue=1)
+        await limiter.acquire()
+        queued = asyncio.create_task(limiter.acquire())
+        await asyncio.sleep(0)
+        with pytest.raises(HTTPException) as rejected:
+            await limiter.acquire()
+        queued.cancel()
+        return limiter, rejected.value
+
+    limiter, error = asyncio.run(scenario())
+    assert error.status_code == 429
+    assert error.headers["Retry-After"] == "7"
+    assert limiter.rejected == 1
+
+
+def test_queue_timeout_is_rejected_and_leaves_the_queue():
+    async def scenario():
+        limiter = make_limiter(queue_timeout=0.05)
+        await limiter.acquire()
+        with pytest.raises(HTTPException) as rejected:
+            await limiter.acquire()
+        return limiter, rejected.value
+
+    limiter, error = asyncio.run(scenario())
+    assert error.status_code == 429
+    assert error.headers["Retry-After"] == "7"
+    assert limiter.stats() == {"limit": 1, "active": 1, "queued": 0, "rejected": 1}
+
+
+def test_background_work_waits_past_the_queue_limits():
+    async def scenario():
+        limiter = make_limiter(max_queue=0, queue_timeout=0.01)
+        await limiter.acquire()
+        waiter = asyncio.create_task(limiter.acquire(bounded=False))
+        await asyncio.sleep(0.05)
+        assert not waiter.done()
+        limiter.release()
+        await waiter
+        limiter.release()
+        return limiter.stats()
+
+    assert asyncio.run(scenario())["active"] == 0
+
+
+def test_waiter_cancelled_after_being_handed_a_slot_gives_it_back():
+    async def scenario():
+        limiter = make_limiter()
+        await limiter.acquire()
+        waiter = asyncio.create_task(limiter.acquire())
+        await asyncio.sleep(0)
+        # Hand the slot over, then cancel before the waiter gets to run
+        limiter.release()
+        waiter.cancel()
+        try:
+            await waiter
+        except asyncio.CancelledError:
+            pass
+        else:
+            # Some Python versions let acquire() finish instead; then the slot is the caller's
+            limiter.release()
+        return limiter.stats()
+
+    stats = asyncio.run(scenario())
+    assert stats["active"] == 0 and stats["queued"] == 0
+
+
+def test_waiter_cancelled_in_the_queue_does_not_take_a_slot():
+    async def scenario():
+        limiter = make_limiter()
+        await limiter.acquire()
+        waiter = asyncio.create_task(limiter.acquire())
+        await asyncio.sleep(0)
+        waiter.cancel()
+        with pytest.raises(asyncio.CancelledError):
+            await waiter
+        limiter.release()
+        return limiter.stats()
+
+    stats = asyncio.run(scenario())
+    assert stats["active"] == 0 and stats["queued"] == 0
+
+
+@pytest.fixture
+def limiter(monkeypatch):
+    limiter = make_limiter(limit=2)
+    monkeypatch.setitem(admission.limiters, "test", limiter)
+    return limiter
+
+
+@pytest.fixture
+def app(limiter):
+    app = FastAPI()
+    admitted = admission.admit("test")
+
+    @app.get("/plain")
+    def plain(slot: admission.Slot = Depends(admitted)):
+        return {"active": limiter.active}
+
+    @app.get("/failing")
+    def failing(slot: admission.Slot = Depends(admitted)):
+        raise HTTPException(status_code=500, detail="boom")
+
+    @app.get("/stream")
+    def stream(fail: bool = False, slot: admission.Slot = Depends(admitted)):
+        def generate():
+            yield '{"n": 1}\n'
+            if fail:
+                raise RuntimeError("stream broke")
+            yield '{"n": 2}\n'
+        return StreamingResponse(slot.stream(generate()), media_type="application/x-ndjson",
+                                 background=slot.hold())
+
+    return app
+
+
+def get(app, limiter, path: str, query: str = ""):
+    """Send one GET straight through the ASGI app. Returns (status, body, error,
+    slots still active once released slots have come back from worker threads)."""
+    async def scenario():
+        scope = {
+            "type": "http", "asgi": {"version": "3.0"}, "http_version": "1.1", "method": "GET",
+            "scheme": "http", "path": path, "raw_path": path.encode(), "root_path": "",
+            "query_string": query.encode(), "headers": [], "client": ("test", 1), "server": ("test", 80)
+        }
+        requested = False
+        messages = []
+
+        async def receive():
+            nonlocal requested
+            if not requested:
+                requested = True
+                return {"type": "http.request", "body": b"", "more_body": False}
+            await asyncio.Event().wait()
+
+        async def send(message):
+            messages.append(message)
+
+        error = None
+        try:
+            await app(scope, receive, send)
+        except Exception as e:
+            error = e
+        for _ in range(100):
+            if not limiter.active:
+                break
+            await asyncio.sleep(0.01)
+        status = next(m["status"] for m in messages if m["type"] == "http.response.start")
+        body = b"".join(m.get("body", b"") for m in messages if m["type"] == "http.response.body")
+        return status, body.decode(), error, limiter.active
+
+    return asyncio.run(scenario())
+
+
+def test_plain_handler_releases_its_slot(app, limiter):
+    status, body, error, active = get(app, limiter, "/plain")
+    assert (status, body, error, active) == (200, '{"active":1}', None, 0)
+
+
+def test_failing_handler_releases_its_slot(app, limiter):
+    status, _, _, active = get(app, limiter, "/failing")
+    assert (status, active) == (500, 0)
+
+
+def test_stream_keeps_its_slot_until_sent(app, limiter):
+    status, body, error, active = get(app, limiter, "/stream")
+    assert (status, body, error, active) == (200, '{"n": 1}\n{"n": 2}\n', None, 0)
+
+
+def test_stream_error_releases_its_slot(app, limiter):
+    status, body, error, active = get(app, limiter, "/stream", "fail=true")
+    assert status == 200 and body == '{"n": 1}\n'
+    # anyio may wrap it in an ExceptionGroup
+    assert "stream broke" in repr(error)
+    assert active == 0
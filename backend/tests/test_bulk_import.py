@@ -0,0 +1,107 @@
+"""
+Bulk Spotify import - per-track and per-playlist failures stay contained
+"""
+from app import jobs
+from app.bulk_import import run_spotify_bulk_import
+from app.plex_service import MatchResult, PlexService
+from app.spotify_service import SpotifyPlaylist, SpotifyTrack
+
+
+class FakeItem:
+    def __init__(self, title):
+        self.title = title
+        self.deleted = False
+
+    def delete(self):
+        self.deleted = True
+
+
+class FakeServer:
+    def __init__(self, playlists=(), fail_create=False):
+        self._playlists = [FakeItem(title) for title in playlists]
+        self.fail_create = fail_create
+
+    def playlists(self):
+        return list(self._playlists)
+
+    def createPlaylist(self, name, items):
+        if self.fail_create:
+            raise RuntimeError("Plex said no")
+        self._playlists.append(FakeItem(name))
+
+
+def plex_service(server):
+    plex = PlexService("http://plex", "token")
+    plex._server = server
+    plex._resolve_items = lambda items: items
+    return plex
+
+
+def test_overwrite_without_matches_keeps_the_existing_playlist():
+    server = FakeServer(["Mix"])
+    error = plex_service(server).create_playlist("Mix", [], overwrite=True)
+    assert error == "No matching tracks found in Plex library"
+    assert not server.playlists()[0].deleted
+
+
+def test_failed_overwrite_keeps_the_existing_playlist():
+    server = FakeServer(["Mix"], fail_create=True)
+    assert plex_service(server).create_playlist("Mix", ["track"], overwrite=True) == "Plex said no"
+    assert not server.playlists()[0].deleted
+
+
+def test_overwrite_replaces_the_existing_playlist():
+    server = FakeServer(["Mix"])
+    assert plex_service(server).create_playlist("Mix", ["track"], overwrite=True) is None
+    old, new = server.playlists()
+    assert old.deleted and not new.deleted
+
+
+def test_plex_errors_are_returned_not_raised():
+    class Unreachable(FakeServer):
+        def playlists(self):
+            raise ConnectionError("Plex went away")
+
+    assert plex_service(Unreachable()).create_playlist("Mix", ["track"]) == "Plex went away"
+
+
+def test_one_failed_match_does_not_fail_the_job(store):
+    playlists = {
+        f"https://open.spotify.com/playlist/{n}": SpotifyPlaylist(
+            name=f"List {n}", description=None, owner="me", url="",
+            tracks=[SpotifyTrack(title=f"Song {n}", artist="Artist"), SpotifyTrack(title="Broken", artist="Artist")]
+        )
+        for n in range(2)
+    }
+
+    class Spotify:
+        def get_playlist(self, url):
+            return playlists[url]
+
+    class Plex:
+        created = {}
+
+        def get_existing_playlists(self):
+            raise ConnectionError("Plex went away")
+
+        def find_track(self, track):
+            if track.title == "Broken":
+                raise ConnectionError("search timed out")
+            return MatchResult(track=track, plex_track=track.title, matched=True, match_type="exact")
+
+        def create_playlist(self, name, plex_tracks, overwrite=False):
+            self.created[name] = plex_tracks
+
+        class match_cache:
+            @staticmethod
+            def flush():
+                pass
+
+    job = jobs.create_job("spotify_bulk_import")
+    plex = Plex()
+    run_spotify_bulk_import(job.id, list(playlists), False, Spotify(), plex)
+
+    result = jobs.get_job(job.id)
+    assert result["status"] == "done"
+    assert plex.created == {"List 0": ["Song 0"], "List 1": ["Song 1"]}
+    assert [r["matched_tracks"] for r in result["results"]] == [1, 1]
@@ -0,0 +1,47 @@
+"""
+Circuit breaker - opening, half-open trial call and recovery
+"""
+import time
+
+from app.health import HealthRegistry
+
+
+def open_circuit(registry, name="svc"):
+    for _ in range(registry.config["failure_threshold"]):
+        registry.record_failure(name, "connection refused")
+
+
+def test_circuit_opens_after_repeated_failures():
+    registry = HealthRegistry({"failure_threshold": 2, "cooldown": 30})
+    registry.record_failure("svc", "connection refused")
+    assert registry.allow("svc")
+    registry.record_failure("svc", "connection refused")
+    assert not registry.allow("svc")
+
+
+def test_one_trial_call_after_cooldown(monkeypatch):
+    registry = HealthRegistry({"failure_threshold": 2, "cooldown": 30})
+    open_circuit(registry)
+    now = time.time()
+    monkeypatch.setattr(time, "time", lambda: now + 31)
+
+    assert registry.allow("svc")
+    assert not registry.allow("svc")
+    assert not registry.allow("svc")
+
+    registry.record_success("svc")
+    assert registry.allow("svc") and registry.allow("svc")
+
+
+def test_failed_trial_call_reopens_the_circuit(monkeypatch):
+    registry = HealthRegistry({"failure_threshold": 2, "cooldown": 30})
+    open_circuit(registry)
+    now = time.time()
+    monkeypatch.setattr(time, "time", lambda: now + 31)
+    assert registry.allow("svc")
+
+    registry.record_failure("svc", "connection refused")
+    assert not registry.allow("svc")
+    monkeypatch.setattr(time, "time", lambda: now + 62)
+    assert registry.allow("svc")
+    assert not registry.allow("svc")
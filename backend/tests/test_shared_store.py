@@ -0,0 +1,179 @@
+"""
+Shared store - expiry, atomic updates, transactions and snapshot generations
+"""
+import time
+import threading
+
+import pytest
+
+from app import library_index
+from app.library_index import LibrarySnapshot, LibraryTrack
+
+
+def test_value_round_trip(store):
+    store.put("ns", "a", {"x": [1, 2]})
+    assert store.get("ns", "a") == {"x": [1, 2]}
+    assert store.get("ns", "missing") is None
+    assert store.get("other", "a") is None
+
+
+def test_expired_values_are_invisible_and_purged(store, monkeypatch):
+    store.put("ns", "short", 1, ttl=10)
+    store.put("ns", "long", 2, ttl=1000)
+    store.put("ns", "forever", 3)
+    now = time.time()
+    monkeypatch.setattr(time, "time", lambda: now + 100)
+
+    assert store.get("ns", "short") is None
+    assert sorted(store.values("ns")) == [2, 3]
+    assert store.update("ns", "short", lambda value: None) is None
+
+    store.expire()
+    keys = {key for key, in store.connection().execute("SELECT key FROM kv")}
+    assert keys == {"long", "forever"}
+
+
+def test_update_sets_the_new_ttl(store, monkeypatch):
+    store.put("ns", "job", {"status": "running"})
+
+    def finish(job):
+        job["status"] = "done"
+        return 60
+
+    assert store.update("ns", "job", finish) == {"status": "done"}
+    now = time.time()
+    monkeypatch.setattr(time, "time", lambda: now + 120)
+    assert store.get("ns", "job") is None
+
+
+def test_concurrent_updates_are_not_lost(store):
+    store.put("ns", "counter", {"n": 0})
+
+    def increment(value):
+        value["n"] += 1
+
+    def worker():
+        for _ in range(50):
+            store.update("ns", "counter", increment)
+
+    threads = [threading.Thread(target=worker) for _ in range(4)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    assert store.get("ns", "counter") == {"n": 200}
+
+
+def test_failed_transaction_rolls_back(store):
+    store.put("ns", "kept", 1)
+    with pytest.raises(RuntimeError):
+        with store.transaction() as conn:
+            store._put(conn, "ns", "written", 2, None)
+            conn.execute("DELETE FROM kv WHERE key = 'kept'")
+            raise RuntimeError("abort")
+    assert store.get("ns", "written") is None
+    assert store.get("ns", "kept") == 1
+    # The connection is usable again afterwards
+    store.put("ns", "after", 3)
+    assert store.get("ns", "after") == 3
+
+
+class Section:
+    title = "Music"
+
+
+def fake_tracks(count, fail=False):
+    def iter_tracks(section):
+        for n in range(count):
+            yield LibraryTrack(n, f"title {n}", "artist", "album", 1000, (f"mbid://{n}",))
+        if fail:
+            raise RuntimeError("Plex went away")
+    return iter_tracks
+
+
+def generations(store):
+    return {g for g, in store.connection().execute(
+        "SELECT generation FROM library_tracks UNION SELECT generation FROM library_ids")}
+
+
+@pytest.fixture
+def snapshots(store, monkeypatch):
+    store.executescript(library_index._SCHEMA)
+    monkeypatch.setattr(library_index, "SNAPSHOT_PAGE_SIZE", 10)
+    monkeypatch.setattr(library_index, "SNAPSHOT_DELETE_BATCH", 7)
+    return store
+
+
+def test_rebuild_replaces_the_old_generation(snapshots, monkeypatch):
+    monkeypatch.setattr(library_index, "iter_library_tracks", fake_tracks(25))
+    first = LibrarySnapshot.build(snapshots, "lib", [Section()])
+    second = LibrarySnapshot.build(snapshots, "lib", [Section()])
+
+    assert generations(snapshots) == {second.generation}
+    loaded = LibrarySnapshot.load(snapshots, "lib")
+    assert (loaded.generation, len(loaded), loaded.identifiers) == (second.generation, 25, 25)
+    assert loaded.lookup(["mbid://unknown", "mbid://24"]).title == "title 24"
+    assert first.generation != second.generation
+
+
+def test_failed_build_keeps_the_current_snapshot(snapshots, monkeypatch):
+    monkeypatch.setattr(library_index, "iter_library_tracks", fake_tracks(25))
+    current = LibrarySnapshot.build(snapshots, "lib", [Section()])
+
+    monkeypatch.setattr(library_index, "iter_library_tracks", fake_tracks(25, fail=True))
+    with pytest.raises(RuntimeError):
+        LibrarySnapshot.build(snapshots, "lib", [Section()])
+
+    assert generations(snapshots) == {current.generation}
+    assert LibrarySnapshot.load(snapshots, "lib").generation == current.generation
+
+
+def test_build_drops_only_stale_orphans(snapshots, monkeypatch):
+    day_ns = 86400 * 10**9
+    stale, recent = f"lib@{time.time_ns() - 2 * day_ns}", f"lib@{time.time_ns()}"
+    other_library = f"other@{time.time_ns() - 2 * day_ns}"
+    for generation in (stale, recent, other_library):
+        snapshots.connection().execute(
+            "INSERT INTO library_tracks VALUES (?, 1, 't', 'a', 'b', 1)", (generation,))
+
+    monkeypatch.setattr(library_index, "iter_library_tracks", fake_tracks(3))
+    built = LibrarySnapshot.build(snapshots, "lib", [Section()])
+
+    # A recent one may belong to a build still running in another worker
+    assert generations(snapshots) == {built.generation, recent, other_library}
+
+
+@pytest.fixture
+def match_cache(store):
+    store.executescript(library_index._SCHEMA)
+    return library_index.MatchCache(store)
+
+
+def cached_rows(store):
+    return store.connection().execute("SELECT COUNT(*) FROM match_cache").fetchone()[0]
+
+
+def test_matches_are_written_in_batches(match_cache, store, monkeypatch):
+    monkeypatch.setattr(library_index, "MATCH_CACHE_BATCH", 3)
+    track = LibraryTrack(7, "Song", "Artist", "Album", 1000, ())
+    match_cache.put("lib", "a", track, "exact")
+    match_cache.put("lib", "b", track, "fuzzy")
+
+    # Not written yet, but already served to this worker
+    assert cached_rows(store) == 0
+    assert match_cache.get("lib", "b")[1] == "fuzzy"
+
+    match_cache.put("lib", "c", track, "title")
+    assert cached_rows(store) == 3
+    assert match_cache.get("lib", "a")[0].title == "Song"
+
+
+def test_busy_database_only_loses_cache_entries(match_cache, store, monkeypatch):
+    monkeypatch.setattr(library_index, "MATCH_CACHE_BATCH", 1)
+
+    def locked():
+        raise library_index.sqlite3.OperationalError("database is locked")
+    monkeypatch.setattr(store, "transaction", locked)
+
+    match_cache.put("lib", "a", LibraryTrack(7, "Song", "Artist", "Album", 1000, ()), "exact")
+    assert match_cache.get("lib", "a") is None
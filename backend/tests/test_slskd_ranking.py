@@ -0,0 +1,61 @@
+"""
+slskd candidate ranking - expected time-to-complete first, quality second
+"""
+import json
+
+from app.slskd_service import SlskdService, SlskdSettings
+
+
+class FakeResponse:
+    def __init__(self, body):
+        self._body = json.dumps(body).encode()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        pass
+
+    def iter_content(self, chunk_size):
+        for start in range(0, len(self._body), chunk_size):
+            yield self._body[start:start + chunk_size]
+
+
+def peer(username, files, free_slot=True, queue_length=0, upload_speed=1_000_000):
+    return {"username": username, "hasFreeUploadSlot": free_slot, "queueLength": queue_length,
+            "uploadSpeed": upload_speed, "files": files}
+
+
+def audio(name, extension, size=8_000_000, bit_rate=None, locked=False):
+    return {"filename": name, "extension": extension, "size": size, "bitRate": bit_rate, "isLocked": locked}
+
+
+def ranked(*peers):
+    service = SlskdService("http://slskd", "key", SlskdSettings(max_results=10))
+    service._request_with_retry = lambda *args, **kwargs: FakeResponse(list(peers))
+    return [f.filename for f in service._get_search_responses("search").files]
+
+
+def test_fast_peer_beats_deep_queue_peer_despite_lower_tier():
+    # 99 transfers ahead is about 100 minutes of waiting; the MP3 arrives in seconds
+    order = ranked(
+        peer("busy", [audio("busy.flac", "flac", size=30_000_000)], free_slot=False, queue_length=99),
+        peer("fast", [audio("fast.mp3", "mp3", bit_rate=320)]),
+    )
+    assert order == ["fast.mp3", "busy.flac"]
+
+
+def test_better_tier_wins_when_it_arrives_about_as_soon():
+    order = ranked(
+        peer("mp3", [audio("quick.mp3", "mp3", bit_rate=320)]),
+        peer("flac", [audio("short-queue.flac", "flac", size=30_000_000)], free_slot=False, queue_length=1),
+    )
+    assert order == ["short-queue.flac", "quick.mp3"]
+
+
+def test_locked_files_go_last_and_bitrate_breaks_ties():
+    order = ranked(
+        peer("a", [audio("locked.flac", "flac", locked=True), audio("128.mp3", "mp3", bit_rate=128)]),
+        peer("b", [audio("320.mp3", "mp3", bit_rate=320)]),
+    )
+    assert order == ["320.mp3", "128.mp3", "locked.flac"]
@@ -0,0 +1,40 @@
+"""
+slskd early results - how often a running search's responses are fetched
+"""
+from app.slskd_service import SlskdFile, SlskdSearchResult, SlskdService, SlskdSettings
+
+
+def service_with(files):
+    service = SlskdService("http://slskd", "key", SlskdSettings(good_enough_count=3))
+    service.fetches = []
+    service.stopped = []
+
+    def responses(search_id):
+        service.fetches.append(search_id)
+        return SlskdSearchResult(search_id=search_id, query="", state="InProgress",
+                                 files=list(files), file_count=len(files))
+
+    service._get_search_responses = responses
+    service._stop_search = service.stopped.append
+    return service
+
+
+def mp3(n):
+    return SlskdFile(username="peer", filename=f"{n}.mp3", size=5_000_000, extension="mp3")
+
+
+def test_growing_search_is_rechecked_only_when_its_count_doubles():
+    service = service_with([mp3(n) for n in range(5)])
+    seen = {}
+    for file_count in range(1, 30):
+        assert service._early_result("s", {"fileCount": file_count}, seen) is None
+    # Checked at 3, 6, 12 and 24 files instead of on every increase
+    assert len(service.fetches) == 4
+
+
+def test_good_enough_results_stop_the_search():
+    flac = SlskdFile(username="peer", filename="a.flac", size=30_000_000, extension="flac")
+    service = service_with([flac, flac, flac])
+    result = service._early_result("s", {"fileCount": 3}, {})
+    assert result.state == "Stopped" and len(result.files) == 3
+    assert service.stopped == ["s"]